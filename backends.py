@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+from pose_tflite import TflitePose
+import depthai as dai
+import numpy as np
+import movenet
+import tools
+
+
+class PoseBackend:
+    """Where the pose is inferred. The runtime builds the pipeline, reads the frames and sends the landmarks.
+
+    infer() returns a (joints, 4) float32 array of x, y (normalized, from the top left of the warped frame),
+    z and score, with nan for joints the backend rejected, or None when nobody was found.
+    """
+
+    name = None
+    joints = 33       # Rows returned by infer()
+    nose_size = 3     # Values sent on /nose
+    stream = "warped"  # Stream that drives the runtime, one message per inferred frame
+    on_host = True    # Inference runs on the warped frame in the host process
+    skeleton = ()     # Joint pairs drawn on the preview
+    stateful = False  # Tracks the pose from frame to frame, so one stream needs one model instance
+
+    def __init__(self, config):
+        self.config = config
+
+    def attach(self, pipeline, config, warped):
+        # Add the device nodes fed by the warped output
+        pass
+
+    def infer(self, packet):
+        # Results are read by the output stage after the next inference started, each gets a pooled buffer
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MediapipeBackend(PoseBackend):
+    name = "mediapipe"
+    stateful = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        import mediapipe as mp
+
+        self.pose = mp.solutions.pose.Pose(
+            model_complexity=config.mp_pose_model_complexity,
+            enable_segmentation=config.mp_pose_enable_segmentation,
+            smooth_segmentation=config.mp_pose_smooth_segmentation,
+            min_detection_confidence=config.mp_pose_min_detection_confidence,
+            min_tracking_confidence=config.mp_pose_min_tracking_confidence
+        )
+
+    def infer(self, packet):
+        results = self.pose.process(packet.frame)
+        if not results.pose_landmarks:
+            return None
+        out = self.config.buffers.get("landmarks", (self.joints, 4), np.float32)
+        return tools.read_landmarks(results, out)
+
+    def close(self):
+        self.pose.close()
+
+
+class TfliteBackend(PoseBackend):
+    name = "tflite"
+    stateful = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.pose = TflitePose(config.tflite_path, config.tflite_threads, config.tflite_min_score)
+
+    def infer(self, packet):
+        out = self.config.buffers.get("landmarks", (self.joints, 4), np.float32)
+        return self.pose.process(packet.frame, out)
+
+    def close(self):
+        self.pose.close()
+
+
+class MovenetBackend(PoseBackend):
+    name = "movenet"
+    joints = 17
+    nose_size = 2  # No z
+    stream = "nn"
+    on_host = False
+    skeleton = movenet.SKELETON
+
+    def __init__(self, config):
+        super().__init__(config)
+        # Host side stages that need the frame before inference
+        for option in ("depth", "host_warp", "schedule", "presence"):
+            if getattr(config, option):
+                raise ValueError("config.%s is not available with the movenet backend" % option)
+        self.model = movenet.MODELS[config.movenet_model]
+
+    def attach(self, pipeline, config, warped):
+        size = self.model['input']
+
+        # Image manip
+        manip = tools.create_node(pipeline, config, dai.node.ImageManip,
+                                  "resize to %dx%d for MoveNet" % (size, size))
+        manip.initialConfig.setResize(size, size)
+        manip.setKeepAspectRatio(False)
+        manip.initialConfig.setFrameType(dai.RawImgFrame.Type.BGR888p)
+        manip.setMaxOutputFrameSize(size * size * 3)
+        warped.link(manip.inputImage)
+
+        # Neural network
+        detection_nn = tools.create_node(pipeline, config, dai.node.NeuralNetwork,
+                                         "MoveNet " + config.movenet_model)
+        detection_nn.setBlobPath(self.model['path'])
+        manip.out.link(detection_nn.input)
+
+        # Stream out nn
+        xout_nn = tools.create_node(pipeline, config, dai.node.XLinkOut, "keypoints", "nn")
+        xout_nn.input.setBlocking(False)
+        detection_nn.out.link(xout_nn.input)
+
+    def infer(self, packet):
+        in_nn = packet.nn.getLayerFp16('Identity')
+        if len(in_nn) == 0:
+            return None
+        out = self.config.buffers.get("landmarks", (self.joints, 4), np.float32)
+        threshold = self.config.consistency_threshold if self.config.check_consistency else None
+        return movenet.parse_keypoints(in_nn, out, threshold)
+
+
+BACKENDS = {
+    "mediapipe": MediapipeBackend,
+    "tflite": TfliteBackend,
+    "movenet": MovenetBackend,
+}
+
+
+def create_backend(config):
+    if config.pose_backend not in BACKENDS:
+        raise ValueError("Unknown pose backend: " + str(config.pose_backend))
+    return BACKENDS[config.pose_backend](config)
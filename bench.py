@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+from pythonosc.udp_client import SimpleUDPClient
+from output import OscSink
+import numpy as np
+import tracemalloc
+import argparse
+import platform
+import frames
+import time
+import json
+import sys
+import cv2
+
+PERCENTILES = (50, 95, 99)
+
+
+# --------------------------------------- TIMING ---------------------------------------
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.flags = {}
+        self.t0 = 0.
+        self.frame_start = 0.
+
+    def start(self):
+        self.t0 = self.frame_start = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.samples.setdefault(stage, []).append(now - self.t0)
+        self.t0 = now
+
+    def flag(self, name, value):
+        self.flags.setdefault(name, []).append(value)
+
+    def end(self):
+        self.samples.setdefault("total", []).append(time.perf_counter() - self.frame_start)
+
+    def summary(self):
+        result = {}
+        for stage, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            result[stage] = {'mean_ms': float(ms.mean())}
+            for p in PERCENTILES:
+                result[stage]['p%d_ms' % p] = float(np.percentile(ms, p))
+        return result
+
+
+def measure(step, inputs, warmup, timer=None):
+    # Latency pass
+    for item in inputs[:warmup]:
+        step(item, StageTimer())
+
+    timer = timer or StageTimer()
+    t0 = time.perf_counter()
+    for item in inputs:
+        timer.start()
+        step(item, timer)
+        timer.end()
+    elapsed = time.perf_counter() - t0
+
+    # Allocation pass (tracemalloc slows everything down, keep it separate)
+    peaks = []
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    for item in inputs:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        step(item, StageTimer())
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks
+
+    return {
+        'frames': len(inputs),
+        'fps': len(inputs) / elapsed if elapsed > 0 else 0.,
+        'stages': timer.summary(),
+        'alloc_peak_bytes_per_frame': float(np.mean(peaks)),
+        'retained_blocks_per_frame': blocks / len(inputs),
+    }
+
+
+# --------------------------------------- INPUTS ---------------------------------------
+def synthetic_frames(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    result = []
+    for i in range(count):
+        frame = rng.integers(0, 40, (height, width), dtype=np.uint8)
+
+        # Rough bright silhouette moving across the frame
+        cx = int(width * (0.3 + 0.4 * (i % 60) / 60))
+        cy = height // 2
+        s = height // 8
+        cv2.circle(frame, (cx, cy - 3 * s), s // 2, 220, -1)
+        cv2.ellipse(frame, (cx, cy - s), (s // 2, s), 0, 0, 360, 200, -1)
+        for dx in (-1, 1):
+            cv2.line(frame, (cx, cy - 2 * s), (cx + dx * s, cy - s // 2), 200, s // 5)
+            cv2.line(frame, (cx, cy), (cx + dx * s // 2, cy + 2 * s), 200, s // 4)
+        result.append(frame)
+    return result
+
+
+def synthetic_keypoints(count, seed=0):
+    rng = np.random.default_rng(seed)
+
+    # Standing pose (y, x, score) in MoveNet order
+    base = np.array([
+        [.20, .50], [.18, .52], [.18, .48], [.19, .54], [.19, .46],
+        [.30, .58], [.30, .42], [.42, .62], [.42, .38], [.52, .64], [.52, .36],
+        [.55, .55], [.55, .45], [.72, .56], [.72, .44], [.90, .56], [.90, .44],
+    ])
+    result = []
+    for _ in range(count):
+        kpts = np.empty((17, 3), dtype=np.float16)
+        kpts[:, :2] = base + rng.normal(0, 0.01, base.shape)
+        kpts[:, 2] = rng.uniform(0.3, 0.9, 17)
+        result.append(kpts.ravel())
+    return result
+
+
+def replay_stream(path, stream, count):
+    source = frames.ReplaySource(path, realtime=False, loop=True)
+    result = []
+    while len(result) < count:
+        frame = source.get(stream)
+        if frame is None:
+            break
+        result.append(frame.getCvFrame())
+    return result
+
+
+# --------------------------------------- PATHS ---------------------------------------
+def bench_pose(name, inputs, client, args):
+    # Host pose backends, run on the same frames
+    from engine import Packet
+    import backends
+    import tools
+
+    config = tools.Config(model=args.model)
+    config.pose_backend = name
+    config.tflite_threads = args.threads
+    config.sink = OscSink(client, args.osc_mode)
+    backend = backends.create_backend(config)
+
+    landmarks = tools.Landmarks(backend.joints, backend.nose_size)
+    packet = Packet()
+    rgb = None
+    counts = {'frames': 0, 'detections': 0}
+
+    def step(frame, timer):
+        nonlocal rgb
+        counts['frames'] += 1
+        if frame.ndim == 2:
+            rgb = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB, dst=rgb)
+        else:
+            rgb = frame
+        packet.frame = rgb
+        timer.lap("convert")
+
+        raw = backend.infer(packet)
+        timer.lap("inference")
+        timer.flag("detected", raw is not None)
+
+        if raw is not None:
+            counts['detections'] += 1
+            landmarks.update(raw)
+            timer.lap("landmarks")
+
+            tools.send_landmarks(config, landmarks)
+            timer.lap("osc")
+
+    timer = StageTimer()
+    result = measure(step, inputs, args.warmup, timer)
+    result['detection_rate'] = counts['detections'] / counts['frames']
+    backend.close()
+    return result, timer
+
+
+def bench_movenet(inputs, client, args):
+    import movenet
+    import tools
+
+    config = tools.Config()
+    config.sink = OscSink(client, args.osc_mode)
+
+    landmarks = tools.Landmarks(17, 2)
+    raw = np.empty((17, 4), dtype=np.float32)
+
+    def step(in_nn, timer):
+        movenet.parse_keypoints(in_nn, raw, config.consistency_threshold if config.check_consistency else None)
+        landmarks.update(raw)
+        timer.lap("keypoints")
+
+        tools.send_landmarks(config, landmarks)
+        timer.lap("osc")
+
+    return measure(step, inputs, args.warmup)
+
+
+def both_detected(results, timers):
+    # Inference timings over the frames where every pose backend found someone, the others mostly
+    # time the early return of a backend that found nobody
+    detected = np.logical_and.reduce([timer.flags['detected'] for timer in timers.values()])
+    for name, timer in timers.items():
+        ms = np.array(timer.samples['inference'])[detected] * 1000
+        results[name]['both_detected'] = {'frames': int(detected.sum())}
+        if len(ms):
+            for p in PERCENTILES:
+                results[name]['both_detected']['inference_p%d_ms' % p] = float(np.percentile(ms, p))
+
+
+# --------------------------------------- REPORT ---------------------------------------
+def print_results(results):
+    for name, result in results.items():
+        print("%s: %.1f frames/s over %d frames, %.0f kB peak alloc/frame" % (
+            name, result['fps'], result['frames'], result['alloc_peak_bytes_per_frame'] / 1024))
+        if 'detection_rate' in result:
+            print("  detections %.0f%%" % (result['detection_rate'] * 100))
+        if result.get('both_detected', {}).get('frames'):
+            both = result['both_detected']
+            print("  inference on the %d frames all backends detected: p50 %.3f ms | p95 %.3f ms" % (
+                both['frames'], both['inference_p50_ms'], both['inference_p95_ms']))
+        for stage, stats in result['stages'].items():
+            print("  %-10s p50 %7.3f ms | p95 %7.3f ms | p99 %7.3f ms" % (
+                stage, stats['p50_ms'], stats['p95_ms'], stats['p99_ms']))
+
+
+def compare_results(results, path):
+    with open(path, 'r') as data:
+        previous = json.load(data)['results']
+
+    print("Compared to", path)
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        old = previous[name]
+        print("%s: fps %.1f -> %.1f (%+.1f%%)" % (name, old['fps'], result['fps'],
+                                                 (result['fps'] / old['fps'] - 1) * 100))
+        print("  alloc/frame %.0f -> %.0f kB" % (old['alloc_peak_bytes_per_frame'] / 1024,
+                                                  result['alloc_peak_bytes_per_frame'] / 1024))
+        for stage, stats in result['stages'].items():
+            if stage in old['stages']:
+                before = old['stages'][stage]['p95_ms']
+                print("  %-10s p95 %7.3f -> %7.3f ms" % (stage, before, stats['p95_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the host side tracking path")
+    parser.add_argument("--paths", nargs="+", default=["mediapipe", "movenet"],
+                        choices=["mediapipe", "tflite", "movenet"])
+    parser.add_argument("--frames", type=int, default=300, help="Frames per path")
+    parser.add_argument("--warmup", type=int, default=30, help="Untimed frames before measuring")
+    parser.add_argument("--replay", help="Recording to read frames from (default: synthetic frames)")
+    parser.add_argument("--stream", default="warped", help="Frame stream of the recording (MediaPipe)")
+    parser.add_argument("--resolution", default="1280x720", help="Synthetic frame size")
+    parser.add_argument("--model", type=int, default=0, help="MediaPipe model: 0=lite | 1=full | 2=heavy")
+    parser.add_argument("--threads", type=int, default=4, help="TFLite interpreter threads")
+    parser.add_argument("--osc-port", type=int, default=2222, help="OSC messages go to 127.0.0.1 on this port")
+    parser.add_argument("--osc-mode", default="messages", choices=["messages", "bundle", "blob"])
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    client = SimpleUDPClient("127.0.0.1", args.osc_port)
+    width, height = (int(v) for v in args.resolution.split("x"))
+
+    results = {}
+    if "mediapipe" in args.paths or "tflite" in args.paths:
+        # Both pose backends run on the same frames
+        if args.replay:
+            inputs = replay_stream(args.replay, args.stream, args.frames)
+        else:
+            inputs = synthetic_frames(args.frames, width, height)
+        timers = {}
+        for name in ("mediapipe", "tflite"):
+            if name in args.paths:
+                results[name], timers[name] = bench_pose(name, inputs, client, args)
+        if len(timers) > 1:
+            both_detected(results, timers)
+
+    if "movenet" in args.paths:
+        if args.replay:
+            inputs = replay_stream(args.replay, "nn", args.frames)
+        else:
+            inputs = synthetic_keypoints(args.frames)
+        results['movenet'] = bench_movenet(inputs, client, args)
+
+    print_results(results)
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+    if args.output:
+        report = {
+            'version': 1,
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'source': args.replay or "synthetic",
+            'results': results,
+        }
+        with open(args.output, 'w') as filehandle:
+            json.dump(report, filehandle, indent=2)
+        print("Results written to:", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+class BufferPool:
+    """Preallocated frame buffers per stream, handed out in turn.
+
+    A buffer is reused `depth` calls later, so depth must exceed the number of frames of that stream
+    held at once (engine queues + the frame being shown).
+    """
+
+    def __init__(self, depth=8):
+        self.depth = depth
+        self.pools = {}  # name -> [buffers, next index]
+
+        # Stats
+        self.allocations = 0  # Buffers allocated since the start, constant once all streams are sized
+        self.allocated_bytes = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        pool = self.pools.get(name)
+        if pool is None or pool[0][0].shape != shape or pool[0][0].dtype != dtype:
+            pool = self.pools[name] = [[np.empty(shape, dtype) for _ in range(self.depth)], 0]
+            self.allocations += self.depth
+            self.allocated_bytes += self.depth * pool[0][0].nbytes
+
+        buffers, index = pool
+        pool[1] = (index + 1) % self.depth
+        return buffers[index]
+
+    def like(self, name, frame, channels=None):
+        # Buffer with the size of frame, and the given number of channels
+        shape = frame.shape[:2] if channels is None else frame.shape[:2] + (channels,)
+        return self.get(name, shape, frame.dtype)
+
+    def gauges(self):
+        return {
+            ("buffer_allocations", ""): self.allocations,
+            ("buffer_bytes", ""): self.allocated_bytes,
+        }
+
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+from collections import deque
+
+
+class ControlPlane:
+    def __init__(self, handlers):
+        self.handlers = handlers  # OSC address -> handler(config, msg)
+        self.queue = deque()      # append / popleft are atomic, no lock needed
+
+        # Stats
+        self.received = 0
+        self.applied = 0
+
+    def push(self, address, *msg):
+        # Called from the OSC server threads, never touches config
+        if address in self.handlers:
+            self.queue.append((address, msg))
+            self.received += 1
+
+    def drain(self, config):
+        # Called by the tracking loop between frames, only the latest message per address is applied
+        pending = {}
+        while True:
+            try:
+                address, msg = self.queue.popleft()
+            except IndexError:
+                break
+            pending.pop(address, None)
+            pending[address] = msg
+
+        for address, msg in pending.items():
+            try:
+                self.handlers[address](config, msg)
+            except (ValueError, TypeError, IndexError, KeyError) as e:
+                print("Invalid OSC message", address, msg, "-", e)
+        self.applied += len(pending)
+        return len(pending)
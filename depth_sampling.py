@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+from functools import lru_cache
+import numpy as np
+
+# OAK-D mono cameras, used when there is no device calibration (replay)
+DEFAULT_HFOV = 71.9      # Degrees
+DEFAULT_BASELINE = 0.075  # Meters
+
+
+def default_focal(width):
+    return width / (2 * np.tan(np.radians(DEFAULT_HFOV) / 2))
+
+
+@lru_cache(maxsize=4)
+def patch_offsets(radius):
+    r = np.arange(-radius, radius + 1)
+    dy, dx = np.meshgrid(r, r, indexing="ij")
+    return dy.ravel(), dx.ravel()
+
+
+def sample_disparity(disparity, px, py, radius=3):
+    # Median of the valid (non zero) disparity codes in a square patch around each point, nan if none
+    h, w = disparity.shape[:2]
+    dy, dx = patch_offsets(radius)
+    x = np.clip(np.rint(np.nan_to_num(px)).astype(np.intp)[:, None] + dx, 0, w - 1)
+    y = np.clip(np.rint(np.nan_to_num(py)).astype(np.intp)[:, None] + dy, 0, h - 1)
+
+    patch = disparity[y, x].astype(np.float32)
+    patch[patch <= 0] = np.nan
+    patch.sort(axis=1)  # Invalid pixels (nan) go last
+
+    valid = np.count_nonzero(~np.isnan(patch), axis=1)
+    median = np.take_along_axis(patch, np.maximum(valid - 1, 0)[:, None] // 2, axis=1)[:, 0]
+
+    # Points outside the frame (or nan) have no depth
+    inside = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+    median[~inside] = np.nan
+    return median
+
+
+def disparity_to_depth(disparity, focal, baseline, subpixel_bits=0, out=None):
+    # Disparity codes -> meters (0 = unknown)
+    if out is None:
+        out = np.zeros(len(disparity), dtype=np.float32)
+    pixels = disparity / (1 << subpixel_bits)
+    valid = pixels > 0  # nan compares False
+    out[:] = 0
+    np.divide(focal * baseline, pixels, out=out, where=valid)
+    return out
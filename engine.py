@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+from threading import Thread, Condition, Event, Lock
+from collections import deque
+from metrics import label_string
+import time
+
+
+class Packet:
+    def __init__(self, seq=-1, timestamp=None):
+        self.seq = seq              # Device sequence number of the warped frame
+        self.timestamp = timestamp  # Capture time of the warped frame (host wall clock)
+        self.frame = None           # Warped frame (numpy)
+        self.preview = None         # Full resolution warped frame, when the tracked one is downscaled
+        self.landmarks = None       # Landmarks from inference
+        self.disparity = None       # Raw disparity of the same frame (sampled depth)
+        self.nn = None              # Device inference output of the same frame (device backends)
+        self.stream = None          # Source camera of the frame, its frames stay on one inference pool worker
+
+
+# --------------------------------------- QUEUES ---------------------------------------
+class StageQueue:
+    def __init__(self, name, maxsize=2, policy="drop_oldest", on_drop=None):
+        if policy not in ("drop_oldest", "block"):
+            raise ValueError("Unknown queue policy: " + str(policy))
+
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop  # Called with the queue name for each dropped item
+
+        self.items = deque()
+        self.cond = Condition()
+        self.closed = False
+
+        # Stats
+        self.puts = 0
+        self.dropped = 0
+        self.occupancy_sum = 0
+        self.high_water = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.policy == "block":
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.cond.wait(0.1)
+            elif len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(self.name)
+
+            if self.closed:
+                return False
+
+            self.items.append(item)
+            self.puts += 1
+            self.occupancy_sum += len(self.items)
+            self.high_water = max(self.high_water, len(self.items))
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=0.1):
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if not self.items:
+                return None
+
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        return {
+            'size': len(self.items),
+            'maxsize': self.maxsize,
+            'mean_occupancy': self.occupancy_sum / self.puts if self.puts else 0.,
+            'high_water': self.high_water,
+            'dropped': self.dropped,
+        }
+
+
+# --------------------------------------- STAGES ---------------------------------------
+class Stage:
+    def __init__(self, name, fn, in_queue=None, out_queue=None):
+        self.name = name
+        self.fn = fn
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+
+        self.thread = None
+        self.stop_event = Event()
+        self.error = None
+
+        # Stats
+        self.count = 0
+        self.busy_time = 0.
+        self.start_time = 0.
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.thread = Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                # Capture stages have no input, they produce on their own
+                if self.in_queue is None:
+                    item = None
+                else:
+                    item = self.in_queue.get()
+                    if item is None:
+                        continue
+
+                t0 = time.perf_counter()
+                result = self.fn() if self.in_queue is None else self.fn(item)
+                self.busy_time += time.perf_counter() - t0
+
+                if result is None:
+                    continue
+                self.count += 1
+
+                if self.out_queue is not None:
+                    self.out_queue.put(result)
+
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=1.0):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            'count': self.count,
+            'fps': self.count / elapsed if elapsed > 0 else 0.,
+            'occupancy': self.busy_time / elapsed if elapsed > 0 else 0.,
+        }
+
+
+# --------------------------------------- ENGINE ---------------------------------------
+class Engine:
+    def __init__(self, capture, inference, output, queue_size=2, policy="drop_oldest", metrics=None, collect=None):
+        self.queues = [
+            StageQueue("inference", queue_size, policy, self.queue_dropped),
+            StageQueue("output", queue_size, policy, self.queue_dropped),
+        ]
+        self.stages = [
+            Stage("capture", self.counted_capture(capture), None, self.queues[0]),
+            Stage("inference", inference, self.queues[0], self.queues[1]),
+            Stage("output", self.counted_output(output), self.queues[1], None),
+        ]
+
+        # Packets captured and not output or dropped yet
+        self.in_flight = 0
+        self.flight_lock = Lock()
+
+        # Inference hands packets to an asynchronous pool, collect produces them in order for the output
+        if collect is not None:
+            self.stages[1].out_queue = None
+            self.stages.insert(2, Stage("collect", collect, None, self.queues[1]))
+
+        # Frames lost before reaching the host (gaps in device sequence numbers)
+        self.metrics = metrics
+        self.device_drops = {}
+        self.last_seq = {}
+
+        self.last_report = time.perf_counter()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for queue in self.queues:
+            queue.close()
+        for stage in self.stages:
+            stage.join()
+
+    def counted_capture(self, capture):
+        def produce():
+            packet = capture()
+            if packet is not None:
+                with self.flight_lock:
+                    self.in_flight += 1
+            return packet
+        return produce
+
+    def counted_output(self, output):
+        def consume(packet):
+            try:
+                return output(packet)
+            finally:
+                self.discard()
+        return consume
+
+    def discard(self):
+        # A packet left the engine, output or dropped on the way
+        with self.flight_lock:
+            self.in_flight -= 1
+
+    def queue_dropped(self, name):
+        self.discard()
+        if self.metrics is not None:
+            self.metrics.inc("queue_dropped_total", queue=name)
+
+    def end_capture(self):
+        # The source ran out, the other stages keep going until drained
+        self.stages[0].stop()
+
+    def drain(self, timeout=5.):
+        # Waits until every captured packet was output or dropped (end of a replay)
+        deadline = time.perf_counter() + timeout
+        capture = self.stages[0]
+        while time.perf_counter() < deadline:
+            self.check()
+
+            # Once capture has stopped, nothing new enters the count
+            if not capture.thread.is_alive():
+                with self.flight_lock:
+                    if self.in_flight <= 0:
+                        return True
+            time.sleep(0.005)
+        return False
+
+    def check(self):
+        # Re-raise errors from worker threads in the caller
+        for stage in self.stages:
+            if stage.error is not None:
+                self.stop()
+                raise RuntimeError("Stage '" + stage.name + "' failed") from stage.error
+
+    def track_sequence(self, stream, seq):
+        last = self.last_seq.get(stream)
+        if last is not None and seq > last + 1:
+            self.device_drops[stream] = self.device_drops.get(stream, 0) + seq - last - 1
+            if self.metrics is not None:
+                self.metrics.inc("device_dropped_frames_total", seq - last - 1, stream=stream)
+        self.last_seq[stream] = seq
+
+    def stats(self):
+        return {
+            'stages': {stage.name: stage.stats() for stage in self.stages},
+            'queues': {queue.name: queue.stats() for queue in self.queues},
+            'device_drops': dict(self.device_drops),
+        }
+
+    def gauges(self):
+        gauges = {}
+        for stage in self.stages:
+            stats = stage.stats()
+            gauges[("stage_fps", label_string({'stage': stage.name}))] = stats['fps']
+            gauges[("stage_busy_ratio", label_string({'stage': stage.name}))] = stats['occupancy']
+        for queue in self.queues:
+            stats = queue.stats()
+            gauges[("queue_size", label_string({'queue': queue.name}))] = stats['size']
+            gauges[("queue_mean_occupancy", label_string({'queue': queue.name}))] = stats['mean_occupancy']
+        return gauges
+
+    def report(self, interval):
+        if interval <= 0 or time.perf_counter() - self.last_report < interval:
+            return
+        self.last_report = time.perf_counter()
+
+        stats = self.stats()
+        line = []
+        for name, stage in stats['stages'].items():
+            line.append("%s %.1f fps %d%%" % (name, stage['fps'], stage['occupancy'] * 100))
+        for name, queue in stats['queues'].items():
+            line.append("q_%s %.1f/%d drop %d" % (name, queue['mean_occupancy'], queue['maxsize'],
+                                                 queue['dropped']))
+        for name, drops in stats['device_drops'].items():
+            line.append("device %s drop %d" % (name, drops))
+        print(" | ".join(line))
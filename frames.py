@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+from contextlib import contextmanager
+from datetime import timedelta
+from collections import deque
+import depthai as dai
+import numpy as np
+import struct
+import mmap
+import time
+
+# Recording file layout (little endian, all records 8 byte aligned):
+#   file header:   magic (8s) | end offset of the last complete record (Q)
+#   record header: name length (H) | dtype code (B) | ndim (B) | seq (q) | timestamp (d) | shape (4I)
+#   record body:   stream name, padding, raw frame data, padding
+FILE_MAGIC = b"OAKREC01"
+FILE_HEADER = struct.Struct("<8sQ")
+RECORD_HEADER = struct.Struct("<HBBqd4I")
+
+DTYPES = [np.dtype(np.uint8), np.dtype(np.uint16), np.dtype(np.float16), np.dtype(np.float32)]
+
+
+def align(n):
+    return (n + 7) & ~7
+
+
+class Frame:
+    """Host side stand-in for a dai.ImgFrame / dai.NNData."""
+
+    def __init__(self, data, seq, timestamp):
+        self.data = data
+        self.seq = seq
+        self.timestamp = timestamp
+        self.host_timestamp = 0.  # Host time the replay served the frame
+
+    def getCvFrame(self):
+        return self.data
+
+    def getFrame(self):
+        return self.data
+
+    def getLayerFp16(self, name=None):
+        return self.data
+
+    def getFirstLayerFp16(self):
+        return self.data
+
+    def getSequenceNum(self):
+        return self.seq
+
+    def getTimestamp(self):
+        return timedelta(seconds=self.timestamp)
+
+
+# --------------------------------------- RECORD ---------------------------------------
+class Recorder:
+    def __init__(self, path, chunk_size=64 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+
+        self.file = open(path, "w+b")
+        self.file.truncate(chunk_size)
+        self.mm = mmap.mmap(self.file.fileno(), chunk_size)
+
+        self.offset = FILE_HEADER.size
+        FILE_HEADER.pack_into(self.mm, 0, FILE_MAGIC, self.offset)
+
+    def grow(self, size):
+        new_size = len(self.mm)
+        while new_size < size:
+            new_size += self.chunk_size
+
+        self.mm.flush()
+        self.mm.close()
+        self.file.truncate(new_size)
+        self.mm = mmap.mmap(self.file.fileno(), new_size)
+
+    def write(self, name, data, seq, timestamp):
+        data = np.ascontiguousarray(data)
+        if data.dtype not in DTYPES or data.ndim > 4:
+            raise ValueError("Cannot record %s array of shape %s" % (data.dtype, data.shape))
+
+        name = name.encode()
+        shape = tuple(data.shape) + (0,) * (4 - data.ndim)
+
+        name_start = self.offset + RECORD_HEADER.size
+        data_start = align(name_start + len(name))
+        end = align(data_start + data.nbytes)
+        if end > len(self.mm):
+            self.grow(end)
+
+        RECORD_HEADER.pack_into(self.mm, self.offset, len(name), DTYPES.index(data.dtype), data.ndim,
+                                seq, timestamp, *shape)
+        self.mm[name_start:name_start + len(name)] = name
+        self.mm[data_start:data_start + data.nbytes] = data.reshape(-1).view(np.uint8)
+
+        # Only publish the record once it is complete
+        self.offset = end
+        FILE_HEADER.pack_into(self.mm, 0, FILE_MAGIC, self.offset)
+
+    def record(self, name, msg):
+        if hasattr(msg, "getFirstLayerFp16"):
+            data = np.asarray(msg.getFirstLayerFp16(), dtype=np.float32)
+        else:
+            data = msg.getCvFrame()
+        self.write(name, data, msg.getSequenceNum(), msg.getTimestamp().total_seconds())
+
+    def close(self):
+        if self.mm is None:
+            return
+        self.mm.flush()
+        self.mm.close()
+        self.file.truncate(self.offset)
+        self.file.close()
+        self.mm = None
+
+
+# --------------------------------------- SOURCES ---------------------------------------
+class DeviceSource:
+    def __init__(self, device, streams, recorder=None):
+        self.device = device
+        self.recorder = recorder
+        self.finished = False
+        self.streams = set(streams)
+        self.queues = {name: device.getOutputQueue(name=name, maxSize=4, blocking=False) for name in streams}
+
+    def get(self, name):
+        msg = self.queues[name].get()
+        if self.recorder is not None and msg is not None:
+            self.recorder.record(name, msg)
+        return msg
+
+    def tryGet(self, name):
+        msg = self.queues[name].tryGet()
+        if self.recorder is not None and msg is not None:
+            self.recorder.record(name, msg)
+        return msg
+
+    def host_time(self, msg):
+        # Device timestamps are synced to the host monotonic clock, map them to wall clock time
+        return time.time() - (dai.Clock.now() - msg.getTimestamp()).total_seconds()
+
+    def close(self):
+        pass
+
+
+class ReplaySource:
+    def __init__(self, path, realtime=True, loop=False, max_pending=16):
+        self.device = None
+        self.realtime = realtime
+        self.loop = loop
+        self.finished = False
+
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, end = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError("Not a recording: " + str(path))
+
+        # Index all records once, frames are then served as views on the map
+        self.records = []
+        offset = FILE_HEADER.size
+        while offset < end:
+            name_len, dtype, ndim, seq, timestamp, *shape = RECORD_HEADER.unpack_from(self.mm, offset)
+            name_start = offset + RECORD_HEADER.size
+            name = self.mm[name_start:name_start + name_len].decode()
+            data_start = align(name_start + name_len)
+            shape = tuple(shape[:ndim])
+            dtype = DTYPES[dtype]
+            nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+
+            self.records.append((name, seq, timestamp, dtype, shape, data_start))
+            offset = align(data_start + nbytes)
+
+        self.streams = {record[0] for record in self.records}
+        self.pending = {name: deque(maxlen=max_pending) for name in self.streams}
+        self.cursor = 0
+
+        self.start_time = None
+        self.start_timestamp = None
+
+    def frame(self, index):
+        name, seq, timestamp, dtype, shape, offset = self.records[index]
+        count = int(np.prod(shape, dtype=np.int64))
+        data = np.frombuffer(self.mm, dtype=dtype, count=count, offset=offset).reshape(shape)
+        return Frame(data, seq, timestamp)
+
+    def wait(self, frame):
+        if not self.realtime:
+            return
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+            self.start_timestamp = frame.timestamp
+
+        delay = self.start_time + (frame.timestamp - self.start_timestamp) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def next(self):
+        if self.cursor >= len(self.records):
+            if not self.loop or not self.records:
+                self.finished = True
+                return None, None
+            self.cursor = 0
+            self.start_time = None
+
+        name = self.records[self.cursor][0]
+        frame = self.frame(self.cursor)
+        frame.host_timestamp = time.time()
+        self.cursor += 1
+        return name, frame
+
+    def get(self, name):
+        # Stream was not recorded
+        if name not in self.streams:
+            return None
+
+        if self.pending[name]:
+            return self.pending[name].popleft()
+
+        while True:
+            stream, frame = self.next()
+            if frame is None:
+                return None
+
+            if stream == name:
+                self.wait(frame)
+                return frame
+            self.pending[stream].append(frame)
+
+    def tryGet(self, name):
+        return self.get(name)
+
+    def host_time(self, frame):
+        # Replayed frames are captured when they are read from the file
+        return frame.host_timestamp
+
+    def close(self):
+        # Frames handed out still reference the map, let the GC release it
+        self.records = []
+        self.file.close()
+
+
+@contextmanager
+def open_source(config, pipeline, streams, recorder=None):
+    if config.replay_path is not None:
+        source = ReplaySource(config.replay_path, config.replay_realtime, config.replay_loop)
+        try:
+            yield source
+        finally:
+            source.close()
+    else:
+        with dai.Device(pipeline) as device:
+            yield DeviceSource(device, streams, recorder)
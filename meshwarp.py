@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+import numpy as np
+import cv2
+
+
+def interpolate_mesh(mesh, width, height):
+    # Bilinear interpolation of a (rows, cols, 2) control mesh over a width x height grid,
+    # the corner control points land exactly on the corner pixels
+    rows, cols = mesh.shape[:2]
+    mesh = mesh.astype(np.float32)
+
+    gx = np.linspace(0, cols - 1, width, dtype=np.float32)
+    x0 = np.minimum(gx.astype(int), cols - 2)
+    fx = (gx - x0)[None, :, None]
+    along_x = mesh[:, x0] * (1 - fx) + mesh[:, x0 + 1] * fx
+
+    gy = np.linspace(0, rows - 1, height, dtype=np.float32)
+    y0 = np.minimum(gy.astype(int), rows - 2)
+    fy = (gy - y0)[:, None, None]
+    return (along_x[y0] * (1 - fy) + along_x[y0 + 1] * fy).astype(np.float32)
+
+
+def sample_mesh(mesh, u, v):
+    # Source position of normalized output points (u, v), with the same interpolation as interpolate_mesh
+    rows, cols = mesh.shape[:2]
+    mesh = mesh.astype(np.float32)
+
+    gx = np.clip(u, 0, 1) * (cols - 1)
+    x0 = np.minimum(gx.astype(int), cols - 2)
+    fx = (gx - x0)[:, None]
+
+    gy = np.clip(v, 0, 1) * (rows - 1)
+    y0 = np.minimum(gy.astype(int), rows - 2)
+    fy = (gy - y0)[:, None]
+
+    top = mesh[y0, x0] * (1 - fx) + mesh[y0, x0 + 1] * fx
+    bottom = mesh[y0 + 1, x0] * (1 - fx) + mesh[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def mesh_from_corners(warp_pos):
+    # [top-left, top-right, bottom-left, bottom-right] -> 2x2 mesh
+    return np.asarray(warp_pos, dtype=np.float32).reshape(2, 2, 2)
+
+
+def mesh_from_osc(msg, res):
+    # rows, cols, then rows * cols normalized (x, y) pairs
+    rows, cols = int(msg[0]), int(msg[1])
+    if rows < 2 or cols < 2 or len(msg) < 2 + rows * cols * 2:
+        raise ValueError("Mesh needs at least 2x2 points and rows * cols (x, y) pairs")
+
+    mesh = np.array(msg[2:2 + rows * cols * 2], dtype=np.float32).reshape(rows, cols, 2)
+    mesh *= (res['w'], res['h'])
+    return mesh
+
+
+class MeshWarp:
+    def __init__(self, cache_size=4):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+        self.key = None
+        self.maps = None
+        self.buffer = None
+
+    def set_mesh(self, mesh, width, height):
+        mesh = np.ascontiguousarray(mesh, dtype=np.float32)
+        key = (mesh.shape, mesh.tobytes(), width, height)
+        if key == self.key:
+            return
+
+        # Remap tables only change with the mesh or the resolution
+        maps = self.cache.pop(key, None)
+        if maps is None:
+            grid = interpolate_mesh(mesh, width, height)
+            maps = cv2.convertMaps(grid, None, cv2.CV_16SC2)
+        self.cache[key] = maps
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        self.key = key
+        self.maps = maps
+
+    def apply(self, frame, mesh=None, dst=None):
+        if mesh is not None:
+            self.set_mesh(mesh, frame.shape[1], frame.shape[0])
+
+        if dst is None:
+            # The output buffer is reused, consumers must be done with the previous frame
+            if self.buffer is None or self.buffer.shape != frame.shape or self.buffer.dtype != frame.dtype:
+                self.buffer = np.empty_like(frame)
+            dst = self.buffer
+
+        cv2.remap(frame, self.maps[0], self.maps[1], cv2.INTER_LINEAR, dst=dst,
+                  borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return dst
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from bisect import bisect_left
+import time
+import re
+
+PREFIX = "oakd_"
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.2, 0.5, 1., 5.)
+
+
+def label_string(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('%s="%s"' % item for item in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.
+        self.count = 0
+
+        # State at the previous interval() call
+        self.last_counts = list(self.counts)
+        self.last_sum = 0.
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the quantile
+        if self.count == 0:
+            return 0.
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.
+
+    def interval(self):
+        # Histogram of the observations since the previous call
+        window = Histogram(self.buckets)
+        window.counts = [a - b for a, b in zip(self.counts, self.last_counts)]
+        window.count = sum(window.counts)
+        window.sum = self.sum - self.last_sum
+
+        self.last_counts = list(self.counts)
+        self.last_sum = self.sum
+        return window
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}      # (name, labels) -> value
+        self.collectors = {}  # name -> callable returning {(name, labels): value} gauges, read on export
+
+    # Each stage has its own histogram and is written by a single thread, no lock needed
+    def observe(self, stage, seconds):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def lap(self, stage, t0):
+        # Observe the time since t0 and return now, to chain stages
+        now = time.perf_counter()
+        self.observe(stage, now - t0)
+        return now
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_string(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, label_string(labels))] = value
+
+    def collect(self):
+        gauges = dict(self.gauges)
+        for collector in list(self.collectors.values()):
+            gauges.update(collector())
+        return gauges
+
+    # --------------------------------------- EXPORT ---------------------------------------
+    def prometheus(self):
+        lines = []
+
+        if self.histograms:
+            lines.append("# TYPE %sstage_seconds histogram" % PREFIX)
+        for stage, histogram in list(self.histograms.items()):
+            total = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                total += count
+                lines.append('%sstage_seconds_bucket{stage="%s",le="%s"} %d' % (PREFIX, stage, bound, total))
+            lines.append('%sstage_seconds_sum{stage="%s"} %f' % (PREFIX, stage, histogram.sum))
+            lines.append('%sstage_seconds_count{stage="%s"} %d' % (PREFIX, stage, histogram.count))
+
+        for kind, values in (("counter", self.counters), ("gauge", self.collect())):
+            typed = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in typed:
+                    lines.append("# TYPE %s%s %s" % (PREFIX, name, kind))
+                    typed.add(name)
+                lines.append("%s%s%s %s" % (PREFIX, name, labels, value))
+
+        return "\n".join(lines) + "\n"
+
+    def send_stats(self, osc_sender):
+        # /stats/<stage> [count, mean, p50, p95, p99] in ms since the last call,
+        # /stats/<name> [value] for counters and gauges
+        for stage, histogram in list(self.histograms.items()):
+            histogram = histogram.interval()
+            osc_sender.send_message("/stats/" + stage, [
+                histogram.count,
+                histogram.mean() * 1000,
+                histogram.quantile(0.5) * 1000,
+                histogram.quantile(0.95) * 1000,
+                histogram.quantile(0.99) * 1000,
+            ])
+
+        values = dict(self.counters)
+        values.update(self.collect())
+        for (name, labels), value in sorted(values.items()):
+            address = "/".join(["/stats", name] + re.findall('"([^"]*)"', labels))
+            osc_sender.send_message(address, float(value))
+
+
+class StatsTimer:
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def due(self):
+        if self.interval <= 0 or time.monotonic() - self.last < self.interval:
+            return False
+        self.last = time.monotonic()
+        return True
+
+
+# --------------------------------------- ENDPOINT ---------------------------------------
+def serve(metrics, port, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+import numpy as np
+
+# Blobs of the on-device model
+MODEL_DIR = Path(__file__).parent.joinpath('OakD_Movenet/utils')
+MODELS = {
+    'lightning': {'path': MODEL_DIR.joinpath('movenet_singlepose_lightning_U8_transpose.blob'), 'input': 192},
+    'thunder': {'path': MODEL_DIR.joinpath('movenet_singlepose_thunder_U8_transpose.blob'), 'input': 256}
+}
+
+KEYPOINT_DICT = {
+    'nose': 0,
+    'left_eye': 1,
+    'right_eye': 2,
+    'left_ear': 3,
+    'right_ear': 4,
+    'left_shoulder': 5,
+    'right_shoulder': 6,
+    'left_elbow': 7,
+    'right_elbow': 8,
+    'left_wrist': 9,
+    'right_wrist': 10,
+    'left_hip': 11,
+    'right_hip': 12,
+    'left_knee': 13,
+    'right_knee': 14,
+    'left_ankle': 15,
+    'right_ankle': 16
+}
+
+
+# Joint pairs for spatial consistency check
+JOINT_PAIRS = [('nose', 'left_eye'), ('left_eye', 'right_eye'), ('right_eye', 'left_ear'),
+               ('left_ear', 'right_ear'), ('left_shoulder', 'right_shoulder'),
+               ('left_shoulder', 'left_elbow'), ('right_shoulder', 'right_elbow'),
+               ('left_elbow', 'left_wrist'), ('right_elbow', 'right_wrist'),
+               ('left_shoulder', 'left_hip'), ('right_shoulder', 'right_hip'),
+               ('left_hip', 'left_knee'), ('right_hip', 'right_knee'),
+               ('left_knee', 'left_ankle'), ('right_knee', 'right_ankle')]
+
+PAIR_A = np.array([KEYPOINT_DICT[a] for a, _ in JOINT_PAIRS])
+PAIR_B = np.array([KEYPOINT_DICT[b] for _, b in JOINT_PAIRS])
+
+# Pairs each joint belongs to (pairs x joints)
+PAIR_JOINTS = np.zeros((len(JOINT_PAIRS), 17), dtype=np.uint8)
+PAIR_JOINTS[np.arange(len(JOINT_PAIRS)), PAIR_A] = 1
+PAIR_JOINTS[np.arange(len(JOINT_PAIRS)), PAIR_B] = 1
+
+# Keypoint pairs drawn as bones (0-based)
+SKELETON = [(a - 1, b - 1) for a, b in (
+    (16, 14), (14, 12), (17, 15), (15, 13),
+    (12, 13), (6, 12), (7, 13), (6, 7),
+    (6, 8), (7, 9), (8, 10), (9, 11),
+    (2, 3), (1, 2), (1, 3), (2, 4),
+    (3, 5), (4, 6), (5, 7)
+)]
+
+
+def consistency_masks(kpts, threshold=1.0):
+    """
+    Check spatial consistency of joint positions, for one or many frames.
+
+    Parameters:
+    - kpts (ndarray): (17, 3) or (n_frames, 17, 3) keypoints as output by the model (y, x, confidence).
+    - threshold (float): Threshold for spatial consistency check, scaled by the mean confidence.
+
+    Returns:
+    - mask (ndarray): (17,) or (n_frames, 17), True for joints whose pairs are all within threshold.
+    """
+    kpts = np.asarray(kpts, dtype=np.float32)
+
+    # Dynamic thresholding based on confidence scores
+    limit = kpts[..., 2].mean(axis=-1, keepdims=True) * threshold
+
+    # A joint is rejected if any pair it belongs to is too long
+    distance = np.linalg.norm(kpts[..., PAIR_A, :2] - kpts[..., PAIR_B, :2], axis=-1)
+    rejected = (distance > limit).astype(np.uint8) @ PAIR_JOINTS
+    return rejected == 0
+
+
+def check_spatial_consistency(x_values, y_values, conf_scores, threshold=1.0):
+    """
+    Check spatial consistency of joint positions.
+
+    Parameters:
+    - x_values (list): List of x coordinates for all joints.
+    - y_values (list): List of y coordinates for all joints.
+    - threshold (float): Threshold for spatial consistency check.
+
+    Returns:
+    - consistent (bool): True if spatially consistent, False otherwise.
+    """
+    kpts = np.column_stack((y_values, x_values, conf_scores))
+    return bool(consistency_masks(kpts, threshold).all())
+
+
+def score_consistency_thresholds(kpts, thresholds):
+    """
+    Offline tuning of the consistency threshold.
+
+    Parameters:
+    - kpts (ndarray): (n_frames, 17, 3) keypoints as output by the model.
+    - thresholds (list): Thresholds to try.
+
+    Returns:
+    - accepted (ndarray): (n_thresholds, 17) fraction of frames in which each joint is accepted.
+    """
+    kpts = np.asarray(kpts, dtype=np.float32).reshape(-1, 17, 3)
+    return np.array([consistency_masks(kpts, threshold).mean(axis=0) for threshold in thresholds])
+
+
+def parse_keypoints(in_nn, out=None, threshold=None):
+    # Model output (y, x, score) -> (17, 4) float32 array of x, y, z (0), score, nan for rejected joints
+    kpts = np.asarray(in_nn, dtype=np.float32).reshape(17, 3)
+    if out is None:
+        out = np.empty((17, 4), dtype=np.float32)
+    out[:, 0] = kpts[:, 1]
+    out[:, 1] = kpts[:, 0]
+    out[:, 2] = 0
+    out[:, 3] = kpts[:, 2]
+
+    if threshold is not None:
+        out[~consistency_masks(kpts, threshold), :2] = np.nan
+    return out
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+from pythonosc.osc_message_builder import OscMessageBuilder
+from pythonosc.osc_bundle_builder import OscBundleBuilder
+from multiprocessing import shared_memory
+from pythonosc import osc_bundle_builder
+import numpy as np
+import atexit
+import time
+
+# Columns of LandmarkFrame.data (and of the /landmarks blob)
+FIELDS = ("x", "y", "z", "visibility")  # Backends give one confidence per joint, sent as visibility
+
+
+class LandmarkFrame:
+    def __init__(self, count):
+        self.data = np.zeros((count, len(FIELDS)), dtype=np.float32)
+        self.nose = np.zeros(3, dtype=np.float32)
+        self.nose_size = 3  # Values sent on /nose (MoveNet has no z)
+        self.timestamp = 0.  # Host time of the frame (0 = time of sending)
+        self.seq = -1        # Device sequence number of the frame
+        self.depth = None    # Metric depth of each landmark in meters (0 = unknown), None = not sampled
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    @property
+    def z(self):
+        return self.data[:, 2]
+
+    @property
+    def visibility(self):
+        return self.data[:, 3]
+
+
+def build_message(address, values, arg_type="f"):
+    builder = OscMessageBuilder(address=address)
+    for value in values:
+        builder.add_arg(value, arg_type)
+    return builder.build()
+
+
+# --------------------------------------- SINKS ---------------------------------------
+class OscSink:
+    def __init__(self, client, mode="messages", send_z_visibility=False):
+        if mode not in ("messages", "bundle", "blob"):
+            raise ValueError("Unknown OSC mode: " + str(mode))
+
+        self.client = client
+        self.mode = mode
+        self.send_z_visibility = send_z_visibility
+        self.counter = 0  # Frames sent, lets receivers detect lost bundles
+
+    def messages(self, frame):
+        nose = frame.nose[:frame.nose_size].tolist()
+        messages = [
+            build_message("/nose", nose),
+            build_message("/x", frame.x.tolist()),
+            build_message("/y", frame.y.tolist()),
+        ]
+        if self.send_z_visibility:
+            messages.append(build_message("/z", frame.z.tolist()))
+            messages.append(build_message("/visibility", frame.visibility.tolist()))
+        if frame.depth is not None:
+            messages.append(build_message("/depth", frame.depth.tolist()))
+        return messages
+
+    def bundle(self, frame):
+        # Timetag = capture time of the frame, /frame [counter, device sequence number]
+        bundle = OscBundleBuilder(frame.timestamp or osc_bundle_builder.IMMEDIATELY)
+        bundle.add_content(build_message("/frame", [self.counter, frame.seq], "i"))
+        return bundle
+
+    def send(self, frame):
+        self.counter += 1
+
+        # One datagram per address, as before
+        if self.mode == "messages":
+            for message in self.messages(frame):
+                self.client.send(message)
+            return
+
+        bundle = self.bundle(frame)
+
+        if self.mode == "bundle":
+            for message in self.messages(frame):
+                bundle.add_content(message)
+        else:
+            # Little endian float32, one row of FIELDS per landmark
+            blob = OscMessageBuilder(address="/landmarks")
+            blob.add_arg(frame.data.astype("<f4", copy=False).tobytes(), "b")
+            bundle.add_content(blob.build())
+            if frame.depth is not None:
+                bundle.add_content(build_message("/depth", frame.depth.tolist()))
+
+        self.client.send(bundle.build())
+
+    def send_delta(self, frame, changed):
+        self.counter += 1
+
+        # /delta [index, x, y, z, visibility, ...] for the joints that moved
+        delta = OscMessageBuilder(address="/delta")
+        for i in np.flatnonzero(changed).tolist():
+            delta.add_arg(i, "i")
+            for value in frame.data[i, :4].tolist():
+                delta.add_arg(value, "f")
+
+        if self.mode == "messages":
+            self.client.send(delta.build())
+            return
+
+        bundle = self.bundle(frame)
+        bundle.add_content(delta.build())
+        self.client.send(bundle.build())
+
+
+# --------------------------------------- POLICY ---------------------------------------
+class OutputPolicy:
+    def __init__(self, deadband=0., max_rate=0., keepalive=1., depth_deadband=0.01):
+        self.deadband = deadband    # Minimum x/y/z/visibility change of a joint to send it (scalar or per joint)
+        self.max_rate = max_rate    # Maximum frames sent per second (0 = no limit)
+        self.keepalive = keepalive  # Send the full frame at least every n seconds (0 = never)
+        self.depth_deadband = depth_deadband  # Minimum sampled depth change of a joint to send it (meters)
+
+        self.last_sent = None
+        self.last_depth = None
+        self.last_time = 0.
+        self.last_full = 0.
+
+    def check(self, frame, now=None):
+        # Returns the joints to send, all of them for a full frame, or None to skip this frame
+        now = time.monotonic() if now is None else now
+
+        if self.max_rate > 0 and now - self.last_time < 1 / self.max_rate:
+            return None
+
+        # /delta has no depth, a depth change sends the full frame
+        full = self.last_sent is None or (self.keepalive > 0 and now - self.last_full >= self.keepalive)
+        if frame.depth is not None and not full:
+            full = self.last_depth is None or bool(
+                (np.abs(frame.depth - self.last_depth) > self.depth_deadband).any())
+
+        if full:
+            changed = np.ones(len(frame.data), dtype=bool)
+            self.last_sent = frame.data.copy()
+            self.last_full = now
+        else:
+            moved = np.abs(frame.data - self.last_sent).max(axis=1)
+            changed = moved > self.deadband
+            if not changed.any():
+                return None
+            self.last_sent[changed] = frame.data[changed]
+
+        if frame.depth is not None and changed.all():
+            self.last_depth = frame.depth.copy()
+
+        self.last_time = now
+        return changed
+
+
+class PolicySink:
+    def __init__(self, sink, policy, delta=False):
+        self.sink = sink
+        self.policy = policy
+        self.delta = delta  # Send only the joints that moved
+
+    def send(self, frame):
+        changed = self.policy.check(frame)
+        if changed is None:
+            return False
+
+        if self.delta and not changed.all():
+            self.sink.send_delta(frame, changed)
+        else:
+            self.sink.send(frame)
+        return True
+
+
+class MultiSink:
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def send(self, frame):
+        for sink in self.sinks:
+            sink.send(frame)
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, "close"):
+                sink.close()
+
+
+# --------------------------------------- SHARED MEMORY ---------------------------------------
+# Ring buffer layout (native byte order, little endian on all supported hosts):
+#   header (64 bytes): magic (8s) | version (u32) | slots (u32) | joints (u32) | fields (u32) | slot size (u32)
+#                      | padding | frames written (u64 at offset 32)
+#   slot:              lock (u64) | frame number (u64) | timestamp (f64) | padding
+#                      | data (joints x fields float32) | nose (3 float32), padded to 64 bytes
+#
+# Sequence lock: the writer sets lock = 2n + 1 before writing frame n into slot n % slots and
+# 2n + 2 after. A reader copies the slot and keeps it only if lock was even and unchanged.
+SHM_MAGIC = b"OAKLMK01"
+SHM_VERSION = 1
+SHM_HEADER_SIZE = 64
+SHM_SLOT_HEADER_SIZE = 32
+
+
+def shm_slot_size(joints, fields):
+    return (SHM_SLOT_HEADER_SIZE + (joints * fields + 3) * 4 + 63) & ~63
+
+
+def attach_shm(name):
+    # Readers must not unlink the block when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except (ImportError, AttributeError, KeyError):
+            pass
+        return shm
+
+
+class ShmRing:
+    def __init__(self, shm, slots, joints, fields):
+        self.shm = shm
+        self.slots = slots
+        self.joints = joints
+        self.fields = fields
+        self.slot_size = shm_slot_size(joints, fields)
+
+        buf = shm.buf
+        self.frames_written = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=32)
+
+        # Views on every slot, nothing is parsed per frame
+        self.locks, self.numbers, self.timestamps, self.data, self.noses = [], [], [], [], []
+        for i in range(slots):
+            offset = SHM_HEADER_SIZE + i * self.slot_size
+            self.locks.append(np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=offset))
+            self.numbers.append(np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=offset + 8))
+            self.timestamps.append(np.ndarray((1,), dtype=np.float64, buffer=buf, offset=offset + 16))
+            data_offset = offset + SHM_SLOT_HEADER_SIZE
+            self.data.append(np.ndarray((joints, fields), dtype=np.float32, buffer=buf, offset=data_offset))
+            self.noses.append(np.ndarray((3,), dtype=np.float32, buffer=buf,
+                                         offset=data_offset + joints * fields * 4))
+
+
+class ShmSink:
+    def __init__(self, name, joints, slots=8):
+        fields = len(FIELDS)
+        size = SHM_HEADER_SIZE + slots * shm_slot_size(joints, fields)
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous run
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((5,), dtype=np.uint32, buffer=self.shm.buf, offset=8)
+        header[:] = (SHM_VERSION, slots, joints, fields, shm_slot_size(joints, fields))
+        self.ring = ShmRing(self.shm, slots, joints, fields)
+        self.ring.frames_written[0] = 0
+        self.shm.buf[:8] = SHM_MAGIC
+
+        self.count = 0
+        atexit.register(self.close)
+
+    def send(self, frame):
+        ring = self.ring
+        n = self.count
+        slot = n % ring.slots
+
+        ring.locks[slot][0] = 2 * n + 1
+        ring.numbers[slot][0] = n
+        ring.timestamps[slot][0] = frame.timestamp or time.time()
+        ring.data[slot][:] = frame.data
+        ring.noses[slot][:] = frame.nose
+        ring.locks[slot][0] = 2 * n + 2
+
+        self.count = n + 1
+        ring.frames_written[0] = self.count
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.ring = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class ShmReader:
+    def __init__(self, name):
+        self.shm = attach_shm(name)
+        if bytes(self.shm.buf[:8]) != SHM_MAGIC:
+            raise ValueError("Not a landmark ring buffer: " + name)
+
+        version, slots, joints, fields, _ = np.ndarray((5,), dtype=np.uint32, buffer=self.shm.buf, offset=8)
+        if version != SHM_VERSION:
+            raise ValueError("Unsupported ring buffer version: " + str(version))
+        self.ring = ShmRing(self.shm, int(slots), int(joints), int(fields))
+
+        self.data = np.zeros((joints, fields), dtype=np.float32)
+        self.nose = np.zeros(3, dtype=np.float32)
+
+    def read(self, retries=4):
+        # Newest frame as (frame number, timestamp) with its values copied to self.data / self.nose,
+        # None if nothing was written yet or the writer kept the slot busy
+        ring = self.ring
+        for _ in range(retries):
+            written = int(ring.frames_written[0])
+            if written == 0:
+                return None
+
+            slot = (written - 1) % ring.slots
+            lock = int(ring.locks[slot][0])
+            if lock & 1:
+                continue
+
+            number = int(ring.numbers[slot][0])
+            timestamp = float(ring.timestamps[slot][0])
+            self.data[:] = ring.data[slot]
+            self.nose[:] = ring.noses[slot]
+
+            if int(ring.locks[slot][0]) == lock:
+                return number, timestamp
+        return None
+
+    def close(self):
+        self.ring = None
+        self.shm.close()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+from multiprocessing import shared_memory
+from collections import deque
+from threading import Condition
+from engine import Packet
+import multiprocessing
+import itertools
+import numpy as np
+import queue
+import time
+import cv2
+
+SLOT_ALIGN = 64
+
+
+def worker_settings(config):
+    # Config values a worker needs to build the same backend (all picklable)
+    return {name: value for name, value in vars(config).items()
+            if name == "pose_backend" or name.startswith(("mp_pose_", "tflite_"))}
+
+
+def attach_block(name):
+    # Workers share the resource tracker of the parent, which alone registers and unlinks the block
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)  # Registered again, a no-op for the shared tracker
+
+
+def worker_main(index, settings, jobs, results):
+    # Runs in its own process: frames are read from the shared slots, landmarks go back on the results queue
+    import backends
+    import tools
+
+    try:
+        config = tools.Config()
+        for name, value in settings.items():
+            setattr(config, name, value)
+        backend = backends.create_backend(config)
+    except Exception as e:
+        results.put(("error", index, repr(e)))
+        return
+    results.put(("ready", index))
+
+    shm = None
+    slot_size = 0
+    rgb = None
+    packet = Packet()
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+
+            # New frame block, sent before the first frame that needs it
+            if job[0] == "attach":
+                if shm is not None:
+                    shm.close()
+                shm = attach_block(job[1])
+                slot_size = job[2]
+                continue
+
+            ticket, slot, shape, dtype = job
+            t = time.perf_counter()
+            frame = np.ndarray(shape, dtype, buffer=shm.buf, offset=slot * slot_size)
+            if frame.ndim == 2:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB, dst=rgb)
+                frame = rgb
+            packet.frame = frame
+            landmarks = backend.infer(packet)
+            packet.frame = frame = None  # No view may outlive the block
+
+            landmarks = None if landmarks is None else landmarks.copy()
+            results.put(("result", index, ticket, landmarks, time.perf_counter() - t))
+    except Exception as e:
+        results.put(("error", index, repr(e)))
+    finally:
+        backend.close()
+        if shm is not None:
+            shm.close()
+
+
+class Job:
+    def __init__(self, ticket, packet, generation, slot=None, worker=None, deadline=0.):
+        self.ticket = ticket
+        self.packet = packet
+        self.generation = generation
+        self.slot = slot
+        self.worker = worker
+        self.deadline = deadline
+        self.done = False
+
+
+class InferencePool:
+    """Host inference in worker processes. Frames are handed over in shared memory slots and the packets
+    come back in the order they were submitted (device sequence order).
+
+    Without a live worker, frames are inferred in-process with the fallback backend.
+    """
+
+    def __init__(self, config, fallback, workers=2, mode="stream", timeout=1., slots_per_worker=2):
+        if mode not in ("stream", "round_robin"):
+            raise ValueError("Unknown pool mode: " + str(mode))
+
+        self.settings = worker_settings(config)
+        self.buffers = config.buffers
+        self.fallback = fallback  # In-process backend
+        self.count = workers
+        self.mode = mode          # stream: one worker per camera, round_robin: frames spread over all workers
+        self.timeout = timeout    # Results later than this are dropped (seconds)
+        self.slots = workers * slots_per_worker
+
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        self.jobs = []
+        self.processes = []
+        self.alive = []
+        self.in_flight = [0] * workers
+
+        # Frame block, sized on the first frame
+        self.shm = None
+        self.slot_size = 0
+        self.free = list(range(self.slots))
+
+        self.cond = Condition()
+        self.order = deque()  # Jobs in submission order
+        self.pending = {}     # ticket -> job waiting for its result
+        self.tickets = itertools.count()
+        self.generation = 0   # Packets submitted before the last clear() are not returned
+        self.next = 0
+        self.assigned = {}    # stream -> worker
+        self.on_drop = None   # Called for each packet dropped after a timeout
+
+        # Stats
+        self.timeouts = 0
+        self.fallback_frames = 0
+        self.worker_time = deque(maxlen=256)
+
+    def start(self, wait=60.):
+        for index in range(self.count):
+            jobs = self.context.Queue()
+            process = self.context.Process(target=worker_main, args=(index, self.settings, jobs, self.results),
+                                           name="inference-%d" % index, daemon=True)
+            process.start()
+            self.jobs.append(jobs)
+            self.processes.append(process)
+            self.alive.append(False)
+
+        # Workers load their model before reporting ready
+        deadline = time.time() + wait
+        waiting = set(range(self.count))
+        while waiting and time.time() < deadline:
+            try:
+                message = self.results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(self.processes[i].is_alive() for i in waiting):
+                    break
+                continue
+            if message[0] == "ready":
+                self.alive[message[1]] = True
+            elif message[0] == "error":
+                print("Inference worker %d failed: %s" % (message[1], message[2]))
+            waiting.discard(message[1])
+
+        live = sum(self.alive)
+        if live:
+            print("Inference pool: %d workers (%s)" % (live, self.mode))
+        else:
+            print("Inference pool: no worker started, inferring in-process")
+
+    def live_workers(self):
+        return [index for index, alive in enumerate(self.alive) if alive]
+
+    def route(self, packet, live):
+        if self.mode == "stream":
+            # Same camera, same worker, so its tracking state follows one stream
+            worker = self.assigned.get(packet.stream)
+            if worker not in live:
+                used = list(self.assigned.values())
+                worker = self.assigned[packet.stream] = min(live, key=used.count)
+            return worker
+        self.next = (self.next + 1) % len(live)
+        return live[self.next]
+
+    def allocate(self, nbytes):
+        # Called with the lock held, once every slot is free
+        while len(self.free) < self.slots:
+            self.cond.wait(0.1)
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+
+        self.slot_size = (nbytes + SLOT_ALIGN - 1) & ~(SLOT_ALIGN - 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_size * self.slots)
+        for index in self.live_workers():
+            self.jobs[index].put(("attach", self.shm.name, self.slot_size))
+
+    def submit(self, packet, infer=True):
+        # Packets that skip inference are queued too, they keep their place in the output order
+        job = Job(next(self.tickets), packet, self.generation)
+        live = self.live_workers()
+        if not infer or not live:
+            if infer:
+                self.infer_local(packet)
+            job.done = True
+            with self.cond:
+                self.order.append(job)
+                self.cond.notify_all()
+            return
+
+        frame = packet.frame
+        with self.cond:
+            if self.shm is None or frame.nbytes > self.slot_size:
+                self.allocate(frame.nbytes)
+            while not self.free:
+                self.cond.wait(0.1)
+            job.slot = self.free.pop()
+
+        # The only copy of the frame, workers read it in place
+        np.ndarray(frame.shape, frame.dtype, buffer=self.shm.buf, offset=job.slot * self.slot_size)[:] = frame
+
+        job.worker = self.route(packet, live)
+        job.deadline = time.perf_counter() + self.timeout
+        with self.cond:
+            self.order.append(job)
+            self.pending[job.ticket] = job
+            self.in_flight[job.worker] += 1
+        self.jobs[job.worker].put((job.ticket, job.slot, frame.shape, frame.dtype.str))
+
+    def infer_local(self, packet):
+        if packet.frame.ndim == 2:
+            packet.frame = cv2.cvtColor(packet.frame, cv2.COLOR_GRAY2RGB,
+                                        dst=self.buffers.like("rgb", packet.frame, 3))
+        packet.landmarks = self.fallback.infer(packet)
+        self.fallback_frames += 1
+
+    def collect(self, timeout=0.05):
+        # Next packet in submission order, None if it is not back yet
+        with self.cond:
+            packet = self.pop_ready()
+        if packet is not None:
+            return packet
+
+        try:
+            message = self.results.get(timeout=timeout)
+        except queue.Empty:
+            message = None
+
+        with self.cond:
+            if message is not None:
+                self.receive(message)
+            self.expire()
+            return self.pop_ready()
+
+    def receive(self, message):
+        if message[0] == "error":
+            print("Inference worker %d failed: %s" % (message[1], message[2]))
+            self.alive[message[1]] = False
+            return
+        if message[0] != "result":
+            return
+
+        _, index, ticket, landmarks, elapsed = message
+        self.worker_time.append(elapsed)
+        job = self.pending.pop(ticket, None)
+        if job is None:
+            return  # Expired
+        job.packet.landmarks = landmarks
+        self.release(job)
+
+    def release(self, job):
+        job.done = True
+        self.free.append(job.slot)
+        self.in_flight[job.worker] -= 1
+        self.cond.notify_all()
+
+    def expire(self):
+        # A worker that died never answers, its frames are dropped
+        for index in self.live_workers():
+            if not self.processes[index].is_alive():
+                print("Inference worker %d stopped" % index)
+                self.alive[index] = False
+
+        now = time.perf_counter()
+        while self.order and not self.order[0].done and now > self.order[0].deadline:
+            job = self.order.popleft()
+            del self.pending[job.ticket]
+            self.release(job)
+            self.timeouts += 1
+            if self.on_drop is not None and job.generation == self.generation:
+                self.on_drop()
+
+    def pop_ready(self):
+        while self.order and self.order[0].done:
+            job = self.order.popleft()
+            if job.generation == self.generation:
+                return job.packet
+        return None
+
+    def clear(self):
+        # The source restarted, results still in flight are dropped
+        with self.cond:
+            self.generation += 1
+
+    def close(self):
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                self.jobs[index].put(None)
+        for process in self.processes:
+            process.join(2.)
+            if process.is_alive():
+                process.terminate()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def gauges(self):
+        with self.cond:
+            times = np.array(self.worker_time) if self.worker_time else np.zeros(1)
+        return {
+            ("pool_workers", ""): sum(self.alive),
+            ("pool_in_flight", ""): sum(self.in_flight),
+            ("pool_timeouts", ""): self.timeouts,
+            ("pool_fallback_frames", ""): self.fallback_frames,
+            ("pool_worker_inference_seconds", ""): float(times.mean()),
+        }
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import cv2
+
+LANDMARKS = 33      # Body landmarks, followed by the 2 alignment points and 4 unused ones
+ALIGN_CENTER = 33   # Hips center
+ALIGN_SCALE = 34    # Point above the head, sets the size and rotation of the next region
+ROI_SCALE = 1.25    # Margin around the body (MediaPipe pose tracking)
+
+
+def load_interpreter(path, threads):
+    # Any TFLite runtime, XNNPACK is their default CPU delegate
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise ImportError("The tflite backend needs tflite-runtime, ai-edge-litert or tensorflow") from None
+    return Interpreter(model_path=str(path), num_threads=threads)
+
+
+def sigmoid(values, out):
+    np.negative(values, out=out)
+    np.exp(out, out=out)
+    out += 1
+    np.reciprocal(out, out=out)
+    return out
+
+
+class TflitePose:
+    """Runs the pose landmark model directly, on a region tracked from the previous pose.
+
+    There is no person detector: without a pose the whole frame is used, so this works best when the
+    warped zone is mostly filled by the performer.
+    """
+
+    def __init__(self, path, threads=4, min_score=0.5):
+        self.min_score = min_score  # Pose flag under which the pose is lost and the region reset
+
+        self.interpreter = load_interpreter(path, threads)
+        self.interpreter.allocate_tensors()
+
+        details = self.interpreter.get_input_details()[0]
+        self.size = int(details['shape'][1])
+        self.input_index = details['index']
+        self.input_dtype = details['dtype']
+
+        # Outputs are told apart by size: landmarks (39 x 5) and pose flag (1)
+        self.landmarks_index = self.flag_index = None
+        for output in self.interpreter.get_output_details():
+            count = int(np.prod(output['shape']))
+            if count == 39 * 5:
+                self.landmarks_index = output['index']
+            elif count == 1:
+                self.flag_index = output['index']
+        if self.landmarks_index is None or self.flag_index is None:
+            raise ValueError("Not a pose landmark model: " + str(path))
+
+        # Preallocated crop and transforms
+        self.crop = np.empty((self.size, self.size, 3), dtype=np.uint8)
+        self.to_frame = np.empty((2, 3), dtype=np.float64)  # Model input pixel -> frame pixel
+        self.points = np.empty((39, 3), dtype=np.float32)
+        self.visibility = np.empty(LANDMARKS, dtype=np.float32)
+
+        # Region of interest: center and size in pixels, rotation in radians (None = whole frame)
+        self.roi = None
+        self.score = 0.
+
+    def reset(self):
+        self.roi = None
+
+    def set_roi(self, width, height):
+        if self.roi is None:
+            cx, cy, size, rotation = width / 2, height / 2, max(width, height), 0.
+        else:
+            cx, cy, size, rotation = self.roi
+
+        scale = size / self.size
+        cos, sin = np.cos(rotation) * scale, np.sin(rotation) * scale
+        half = self.size / 2
+        self.to_frame[:] = [[cos, -sin, cx - half * (cos - sin)],
+                            [sin, cos, cy - half * (sin + cos)]]
+        return size
+
+    def track(self, width, height):
+        # Next region from the alignment points, as MediaPipe does between frames
+        cx, cy = self.points[ALIGN_CENTER, :2]
+        dx, dy = self.points[ALIGN_SCALE, :2] - self.points[ALIGN_CENTER, :2]
+        size = 2 * np.hypot(dx, dy) * ROI_SCALE
+        rotation = np.pi / 2 + np.arctan2(dy, dx)
+        rotation = (rotation + np.pi) % (2 * np.pi) - np.pi
+        if size < 1:
+            self.roi = None
+        else:
+            self.roi = (float(cx), float(cy), float(size), float(rotation))
+
+    def process(self, frame, out=None):
+        # RGB frame -> (33, 4) float32 array of x, y (normalized), z, visibility, None if no pose
+        height, width = frame.shape[:2]
+        size = self.set_roi(width, height)
+
+        cv2.warpAffine(frame, self.to_frame, (self.size, self.size), dst=self.crop,
+                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_CONSTANT)
+
+        # Written straight into the input tensor, invoke() refuses to run while a view on it exists
+        tensor = self.interpreter.tensor(self.input_index)()[0]
+        if self.input_dtype == np.float32:
+            np.multiply(self.crop, 1 / 255, out=tensor, casting="unsafe")
+        else:
+            tensor[:] = self.crop
+        del tensor
+        self.interpreter.invoke()
+
+        self.score = float(self.interpreter.get_tensor(self.flag_index).ravel()[0])
+        if self.score < self.min_score:
+            self.reset()
+            return None
+
+        raw = self.interpreter.get_tensor(self.landmarks_index).reshape(39, 5)
+
+        # Model input pixels -> frame pixels
+        self.points[:, :2] = raw[:, :2] @ self.to_frame[:, :2].T.astype(np.float32)
+        self.points[:, :2] += self.to_frame[:, 2].astype(np.float32)
+        self.points[:, 2] = raw[:, 2] * (size / self.size)
+        self.track(width, height)
+
+        if out is None:
+            out = np.empty((LANDMARKS, 4), dtype=np.float32)
+        out[:, 0] = self.points[:LANDMARKS, 0] / width
+        out[:, 1] = self.points[:LANDMARKS, 1] / height
+        out[:, 2] = self.points[:LANDMARKS, 2] / width  # Same scale as x, like MediaPipe
+        out[:, 3] = sigmoid(raw[:LANDMARKS, 3], self.visibility)
+        return out
+
+    def close(self):
+        self.interpreter = None
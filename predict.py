@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+from output import LandmarkFrame
+import numpy as np
+import time
+
+
+class Predictor:
+    """Extrapolates the x, y, z of all joints to the time they are expected to be displayed."""
+
+    def __init__(self, count, mode="velocity", lookahead=0.03, min_confidence=0.5, smoothing=0.5,
+                 process_noise=10., measurement_noise=1e-4, reset_after=0.5):
+        if mode not in ("velocity", "acceleration", "kalman"):
+            raise ValueError("Unknown prediction mode: " + str(mode))
+
+        self.mode = mode
+        self.lookahead = lookahead            # Display latency after sending (seconds)
+        self.min_confidence = min_confidence  # Joints with a lower score are sent as measured
+        self.smoothing = smoothing            # Weight of the new velocity / acceleration (velocity, acceleration)
+        self.process_noise = process_noise    # Acceleration variance (kalman)
+        self.measurement_noise = measurement_noise  # Position variance (kalman)
+        self.reset_after = reset_after        # Restart from the measurement after a gap this long (seconds)
+
+        shape = (count, 3)
+        self.measured = np.zeros(shape, dtype=np.float32)
+        self.position = np.zeros(shape, dtype=np.float32)
+        self.velocity = np.zeros(shape, dtype=np.float32)
+        self.acceleration = np.zeros(shape, dtype=np.float32)
+
+        # Kalman covariance, one independent [position, velocity] filter per joint and axis
+        self.p00 = np.ones(shape, dtype=np.float32)
+        self.p01 = np.zeros(shape, dtype=np.float32)
+        self.p11 = np.ones(shape, dtype=np.float32)
+
+        self.last_time = None
+        self.confident = np.zeros(count, dtype=bool)
+        self.delta = np.zeros(shape, dtype=np.float32)
+
+    def reset(self, measured):
+        self.position[:] = measured
+        self.velocity[:] = 0
+        self.acceleration[:] = 0
+        self.p00[:] = self.measurement_noise
+        self.p01[:] = 0
+        self.p11[:] = 1
+
+    def update(self, measured, confidence, timestamp):
+        # Feed one measurement (count, 3) taken at timestamp (host time, seconds)
+        np.greater_equal(confidence, self.min_confidence, out=self.confident)
+        self.measured[:] = measured
+
+        dt = timestamp - self.last_time if self.last_time is not None else 0.
+        self.last_time = timestamp
+        if dt <= 0 or dt > self.reset_after:
+            self.reset(measured)
+            return
+
+        if self.mode == "kalman":
+            self.update_kalman(measured, dt)
+        else:
+            velocity = (measured - self.position) / dt
+            if self.mode == "acceleration":
+                acceleration = (velocity - self.velocity) / dt
+                self.acceleration += self.smoothing * (acceleration - self.acceleration)
+            self.velocity += self.smoothing * (velocity - self.velocity)
+            self.position[:] = measured
+
+        # Unreliable joints restart from the measurement with no motion
+        lost = ~self.confident
+        self.position[lost] = measured[lost]
+        self.velocity[lost] = 0
+        self.acceleration[lost] = 0
+        self.p00[lost] = self.measurement_noise
+        self.p01[lost] = 0
+        self.p11[lost] = 1
+
+    def update_kalman(self, measured, dt):
+        q = self.process_noise
+
+        # Predict (constant velocity, white noise acceleration)
+        self.position += self.velocity * dt
+        self.p00 += dt * (2 * self.p01 + dt * self.p11) + q * dt ** 3 / 3
+        self.p01 += dt * self.p11 + q * dt ** 2 / 2
+        self.p11 += q * dt
+
+        # Correct
+        s = self.p00 + self.measurement_noise
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        innovation = measured - self.position
+        self.position += k0 * innovation
+        self.velocity += k1 * innovation
+        self.p11 -= k1 * self.p01
+        self.p01 *= 1 - k0
+        self.p00 *= 1 - k0
+
+    def predict(self, horizon):
+        # Offset from the last measurement to the position in horizon seconds
+        np.subtract(self.position, self.measured, out=self.delta)
+        self.delta += self.velocity * horizon
+        if self.mode == "acceleration":
+            self.delta += self.acceleration * (0.5 * horizon * horizon)
+        self.delta[~self.confident] = 0
+        return self.delta
+
+
+class PredictSink:
+    def __init__(self, sink, predictor, count):
+        self.sink = sink
+        self.predictor = predictor
+        self.frame = LandmarkFrame(count)
+
+    def send(self, frame, now=None):
+        # Frames without a capture time are treated as captured now
+        now = time.time() if now is None else now
+        timestamp = frame.timestamp or now
+
+        measured = frame.data[:, :3]
+        self.predictor.update(measured, frame.visibility, timestamp)
+        horizon = now - timestamp + self.predictor.lookahead
+        delta = self.predictor.predict(horizon)
+
+        # Sent frame = measured values moved by the prediction, the input frame is left untouched
+        out = self.frame
+        out.data[:] = frame.data
+        out.data[:, :3] += delta
+        out.nose[:] = frame.nose
+        out.nose[:frame.nose_size] += delta[0, :frame.nose_size]
+        out.nose_size = frame.nose_size
+        out.seq = frame.seq
+        out.depth = frame.depth
+        out.timestamp = timestamp + horizon  # Time the values were predicted for
+
+        return self.sink.send(out)
+
+    def close(self):
+        if hasattr(self.sink, "close"):
+            self.sink.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import time
+import cv2
+
+
+class PresenceGate:
+    """Tells whether someone is in the tracked zone, so inference can stop while the stage is empty."""
+
+    def __init__(self, threshold=0.01, idle_after=10., idle_fps=0, margin=0.05, scale=8, on_change=None):
+        self.threshold = threshold    # Fraction of foreground pixels that counts as presence
+        self.idle_after = idle_after  # Go idle after this long without presence (seconds)
+        self.idle_fps = idle_fps      # Frames checked per second while idle (0 = all)
+        self.margin = margin          # Disparity above the background that counts as foreground (fraction of the range)
+        self.scale = scale            # Downsampling factor of the checked frame
+        self.on_change = on_change    # Called with True / False on active / idle transitions
+
+        self.background = cv2.createBackgroundSubtractorMOG2(history=500, detectShadows=False)
+        self.disparity_background = None
+
+        self.small = None
+        self.mask = None
+        self.active = True
+        self.last_presence = time.time()
+        self.last_check = 0.
+        self.foreground = 0.
+
+    def throttle(self, timestamp=None):
+        # True if this frame can be dropped before any processing (idle and checked recently)
+        timestamp = timestamp or time.time()
+        if self.active or self.idle_fps <= 0:
+            return False
+        return timestamp - self.last_check < 1 / self.idle_fps
+
+    def check(self, frame, timestamp=None, disparity_range=None):
+        # Updates the state from a warped frame (or a raw disparity frame and its range) and returns it
+        timestamp = timestamp or time.time()
+        self.last_check = timestamp
+
+        h, w = frame.shape[:2]
+        size = (max(1, w // self.scale), max(1, h // self.scale))
+        self.small = cv2.resize(frame, size, dst=self.small, interpolation=cv2.INTER_AREA)
+
+        # The background is learned quickly on the empty stage, slowly while someone is there
+        rate = 0.001 if self.active else -1
+        if disparity_range is None:
+            self.mask = self.background.apply(self.small, self.mask, rate)
+            self.foreground = cv2.countNonZero(self.mask) / self.mask.size
+        else:
+            self.foreground = self.check_disparity(self.small.astype(np.float32) / disparity_range, rate)
+
+        if self.foreground > self.threshold:
+            self.last_presence = timestamp
+        self.set_active(timestamp - self.last_presence < self.idle_after)
+        return self.active
+
+    def check_disparity(self, disparity, rate):
+        # Foreground = closer to the camera than the background
+        if self.disparity_background is None or self.disparity_background.shape != disparity.shape:
+            self.disparity_background = disparity.copy()
+        cv2.accumulateWeighted(disparity, self.disparity_background, 0.001 if rate >= 0 else 0.05)
+        return np.count_nonzero(disparity > self.disparity_background + self.margin) / disparity.size
+
+    def seen(self, found, timestamp=None):
+        # A detected person keeps the gate active even if they stand still
+        if found:
+            self.last_presence = timestamp or time.time()
+
+    def set_active(self, active):
+        if active == self.active:
+            return
+        self.active = active
+        if self.on_change is not None:
+            self.on_change(active)
+
+    def gauges(self):
+        return {
+            ("presence_active", ""): int(self.active),
+            ("presence_foreground", ""): self.foreground,
+        }
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+from engine import Engine, Packet
+from scheduler import InferenceScheduler
+from presence import PresenceGate
+from pool import InferencePool
+from sync import SequenceSync
+from metrics import StatsTimer
+from pathlib import Path
+import depthai as dai
+import numpy as np
+import backends
+import frames
+import tools
+import time
+import cv2
+
+
+def run(config):
+    # Pose backend selected at launch (config.pose_backend)
+    backend = backends.create_backend(config)
+    metrics = config.metrics
+    print("Pose backend:", backend.name)
+
+    # Initialize OSC and load custom mesh
+    tools.initialize_osc(config, backend.joints)
+    tools.initialize_metrics(config)
+
+    # Frames held at once: engine queues, one per stage, and the one shown
+    config.buffers.depth = 2 * config.queue_size + 4
+    tools.load_custom_mesh(config)
+
+    # Host inference in worker processes
+    pool = None
+    if config.pool_workers and backend.on_host:
+        if config.schedule:
+            raise ValueError("config.schedule needs in-process inference (config.pool_workers = 0)")
+        workers = config.pool_workers
+        if config.pool_mode == "round_robin" and backend.stateful:
+            print("Warning: round_robin splits the %s tracking state over the workers, "
+                  "use pool_mode = \"stream\"" % backend.name)
+        if config.pool_mode == "stream" and workers > 1:
+            # One camera is one stream, the other workers would only load a model and wait
+            print("Warning: pool_mode \"stream\" runs the one camera stream on one worker, "
+                  "starting 1 of %d workers" % workers)
+            workers = 1
+        pool = InferencePool(config, backend, workers, config.pool_mode, config.pool_timeout)
+        pool.start()
+        metrics.collectors["pool"] = pool.gauges
+
+    # Skips inference while nothing moves
+    scheduler = InferenceScheduler(config.schedule_threshold, config.schedule_max_interval, config.schedule_mode)
+
+    # Stops inference while the stage is empty
+    def presence_changed(active):
+        print("Presence:", "active" if active else "idle")
+        config.osc_sender.send_message("/presence", int(active))
+
+    presence = PresenceGate(config.presence_threshold, config.presence_idle_after, config.idle_fps,
+                            on_change=presence_changed)
+
+    # Record device frames
+    recorder = frames.Recorder(config.record_path) if config.record_path else None
+
+    config.running = True
+    stats_timer = StatsTimer(config.stats_interval)
+    restart_time = None
+
+    # Display the GUI
+    cv2.namedWindow("Oak-D Tracking", cv2.WINDOW_NORMAL)
+    cv2.imshow("Oak-D Tracking", tools.create_gui_bg())
+
+    while config.running:
+        # Create pipeline using warp_pos from tools module and config parameters
+        pipeline = tools.create_pipeline(config, backend)
+        tools.print_pipeline_report(config)
+
+        # Frame streams read on the host, and the ones matched with each inferred frame
+        source_stream = tools.source_stream_name(config)
+        streams = ["warped"] if config.warped_stream else []
+        matched = []
+        if backend.stream != "warped":
+            streams.append(backend.stream)
+        if config.source_stream:
+            streams.append(source_stream)
+        if config.sample_depth:
+            streams.append("depth")
+            matched.append("depth")
+        if tools.use_preview(config):
+            streams.append("preview")
+            matched.append("preview")
+
+        # Connect to device (or open the replay) and start pipeline
+        with frames.open_source(config, pipeline, streams, recorder) as source:
+            device = source.device
+
+            if restart_time is not None:
+                metrics.inc("restarts_total")
+                metrics.inc("restart_seconds_total", time.perf_counter() - restart_time)
+
+            if device is not None:
+                # Verbose
+                if config.verbose:
+                    device.setLogLevel(dai.LogLevel.DEBUG)
+                    device.setLogOutputLevel(dai.LogLevel.DEBUG)
+
+                print("Starting device")
+
+                # Dot brightness
+                device.setIrLaserDotProjectorIntensity(config.laser_val)
+
+                # IR brightness
+                device.setIrFloodLightIntensity(config.ir_val)
+
+                # Focal length and baseline for the sampled depth
+                if config.sample_depth:
+                    tools.read_calibration(config, device)
+            else:
+                print("Replaying", config.replay_path)
+
+            # Tracking values
+            landmarks = tools.Landmarks(backend.joints, backend.nose_size)
+            if config.sample_depth:
+                landmarks.frame.depth = np.zeros(len(landmarks.frame.data), dtype=np.float32)
+
+            # Raw disparity and preview matching the inferred frame
+            sync = SequenceSync(source)
+
+            # Latest frames for the main thread (GUI + corners)
+            latest = {"rectified": None, "warped": None, "tracked": None}
+
+            def capture():
+                if config.source_stream and (config.show_frame or config.find_corners):
+                    latest["rectified"] = source.get(source_stream)
+
+                # Device backends only read the warped frame to show it
+                streams = matched
+                shown = config.show_frame and config.warped_stream and not tools.use_preview(config)
+                if backend.stream != "warped" and shown:
+                    streams = matched + ["warped"]
+
+                t = time.perf_counter()
+                msgs = sync.get(backend.stream, streams)
+                if msgs is None:
+                    if source.finished:
+                        engine.end_capture()
+                    return None
+                in_primary = msgs[backend.stream]
+                t = metrics.lap("queue_wait", t)
+                engine.track_sequence(backend.stream, in_primary.getSequenceNum())
+
+                # Idle with config.idle_fps, frames in between are not checked for presence
+                timestamp = source.host_time(in_primary)
+                if config.presence and presence.throttle(timestamp):
+                    return None
+
+                packet = Packet(in_primary.getSequenceNum(), timestamp)
+                packet.stream = config.cam_source
+                packet.nn = msgs.get("nn")
+                if msgs.get("warped") is not None:
+                    packet.frame = msgs["warped"].getFrame()  # View on the message data, no copy
+                if config.sample_depth and msgs["depth"] is not None:
+                    packet.disparity = msgs["depth"].getFrame()
+                if msgs.get("preview") is not None:
+                    preview = msgs["preview"].getFrame()
+                    packet.preview = cv2.cvtColor(preview, cv2.COLOR_GRAY2BGR,
+                                                  dst=config.buffers.like("preview", preview, 3))
+                metrics.lap("get_cv_frame", t)
+                return packet
+
+            def infer_on_device(packet):
+                t = time.perf_counter()
+                if config.tracking and packet.nn is not None:
+                    packet.landmarks = backend.infer(packet)
+                    t = metrics.lap("read_landmarks", t)
+
+                if packet.frame is not None and config.show_frame:
+                    packet.frame = cv2.cvtColor(packet.frame, cv2.COLOR_GRAY2BGR,
+                                                dst=config.buffers.like("rgb", packet.frame, 3))
+                    metrics.lap("color_conversion", t)
+                return packet
+
+            def inference(packet):
+                if not backend.on_host:
+                    return infer_on_device(packet)
+
+                t = time.perf_counter()
+                if packet.frame is not None and config.host_warp:
+                    packet.frame = config.mesh_warp.apply(packet.frame, tools.get_frame_mesh(config, packet.frame),
+                                                          dst=config.buffers.like("host_warp", packet.frame))
+
+                # Nobody in the warped zone, no inference
+                idle = False
+                if config.presence and packet.frame is not None:
+                    disparity_range = config.max_disparity if config.depth else None
+                    idle = not presence.check(packet.frame, packet.timestamp, disparity_range)
+
+                if packet.frame is not None and config.depth:
+                    packet.frame = tools.get_disparity_frame(packet.frame, config)
+                t = metrics.lap("preprocess", t)
+
+                if config.tracking and packet.frame is not None and not idle:
+                    # Low motion, reuse the last landmarks
+                    if config.schedule and not scheduler.due(packet.frame, packet.timestamp):
+                        out = config.buffers.get("landmarks", (backend.joints, 4), np.float32)
+                        packet.landmarks = scheduler.skip(packet.timestamp, out)
+                        if config.show_frame and not config.depth:
+                            packet.frame = cv2.cvtColor(packet.frame, cv2.COLOR_GRAY2RGB,
+                                                        dst=config.buffers.like("rgb", packet.frame, 3))
+                        metrics.lap("schedule", t)
+                        return packet
+                    t = metrics.lap("schedule", t)
+
+                    # Pose, pool workers convert the frame themselves unless it is shown
+                    if not config.depth and (pool is None or config.show_frame):
+                        packet.frame = cv2.cvtColor(packet.frame, cv2.COLOR_GRAY2RGB,
+                                                    dst=config.buffers.like("rgb", packet.frame, 3))
+                    t = metrics.lap("color_conversion", t)
+                    if pool is not None:
+                        pool.submit(packet)
+                        metrics.lap("pool_submit", t)
+                        return packet  # Counted by the stage, the pool hands it to collect
+                    packet.landmarks = backend.infer(packet)
+                    metrics.lap("inference", t)
+
+                    if config.schedule:
+                        scheduler.update(packet.landmarks, packet.timestamp)
+                    presence.seen(packet.landmarks is not None, packet.timestamp)
+
+                # Frames without inference keep their place among the pool results
+                if pool is not None:
+                    pool.submit(packet, infer=False)
+                return packet
+
+            def collect():
+                packet = pool.collect()
+                if packet is not None:
+                    presence.seen(packet.landmarks is not None, packet.timestamp)
+                return packet
+
+            def output(packet):
+                frame_warped = packet.frame if packet.preview is None else packet.preview
+
+                if not config.tracking:
+                    latest["warped"] = frame_warped
+                    return packet
+
+                # Get tracking values + Send OSC
+                if packet.landmarks is not None:
+                    t = time.perf_counter()
+                    landmarks.update(packet.landmarks)
+                    if config.sample_depth and packet.disparity is not None:
+                        tools.sample_landmark_depth(config, packet.disparity, packet.landmarks, landmarks.frame.depth)
+                    landmarks.frame.timestamp = packet.timestamp
+                    landmarks.frame.seq = packet.seq
+                    t = metrics.lap("postprocess", t)
+                    tools.send_landmarks(config, landmarks)
+                    metrics.lap("osc_send", t)
+                    metrics.observe("capture_to_send", time.time() - packet.timestamp)
+
+                    if config.show_frame and frame_warped is not None:
+                        tools.draw_landmarks(frame_warped, packet.landmarks, backend.skeleton)
+
+                # Show fps on out frame
+                if config.show_frame and frame_warped is not None:
+                    latest["tracked"] = tools.show_frame(frame_warped)
+
+                return packet
+
+            # Capture, inference and output run in their own threads
+            engine = Engine(capture, inference, output, config.queue_size, config.queue_policy, metrics,
+                            collect if pool is not None else None)
+            metrics.collectors["engine"] = engine.gauges
+            if pool is not None:
+                pool.on_drop = engine.discard
+            if config.schedule:
+                metrics.collectors["scheduler"] = scheduler.gauges
+            if config.presence:
+                metrics.collectors["presence"] = presence.gauges
+            engine.start()
+
+            restart_device = False
+            print("Device started")
+
+            while not restart_device:
+                engine.check()
+
+                # Apply OSC commands received since the last iteration
+                config.control.drain(config)
+
+                # End of the replay, frames still in the stages go out first
+                if source.finished:
+                    engine.drain()
+                    tools.stop_program(config)
+                    break
+
+                engine.report(config.report_interval)
+                if stats_timer.due():
+                    metrics.send_stats(config.osc_sender)
+
+                # Draw the mesh
+                if config.show_frame:
+                    tools.show_source_frame(latest["rectified"], config)
+
+                    if not config.tracking and latest["warped"] is not None:
+                        cv2.imshow("Warped", latest["warped"])
+
+                    if config.tracking and latest["tracked"] is not None:
+                        cv2.imshow("Warped and tracked", latest["tracked"])
+
+                # Find corners
+                if config.find_corners and latest["rectified"] is not None:
+                    corners = tools.find_corners(latest["rectified"].getFrame(), config)
+                    tools.set_warp(config, corners)
+
+                # Apply mesh and camera changes, restart the device only if the pipeline must change
+                if config.send_warp_config or config.send_camera_config:
+                    config.send_warp_config = False
+                    config.send_camera_config = False
+
+                    if tools.needs_rebuild(config):
+                        print("Pipeline changed, restarting...")
+                        restart_device = True
+                        restart_time = time.perf_counter()
+                    elif device is not None:
+                        tools.send_live_config(config, device)
+
+                # Save mesh files
+                if config.save_mesh_config:
+                    tools.save_mesh(config.mesh_path, *config.warp)
+                    print("Mesh saved to:", str(Path(config.mesh_path)))
+                    config.save_mesh_config = False
+
+                # Exit
+                key = cv2.waitKey(1) & 0xFF
+                if key == 27 or key == ord('q'):
+                    tools.stop_program(config)
+                    break
+
+            engine.stop()
+            if pool is not None:
+                pool.clear()
+
+    if recorder is not None:
+        recorder.close()
+
+    if pool is not None:
+        pool.close()
+    backend.close()
+    cv2.destroyAllWindows()
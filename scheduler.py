@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+from collections import deque
+import numpy as np
+import time
+import cv2
+
+
+class InferenceScheduler:
+    """Runs pose inference only when the warped frame moved, or at least every max_interval seconds."""
+
+    def __init__(self, threshold=0.01, max_interval=0.5, mode="hold", scale=8, window=2.):
+        if mode not in ("hold", "extrapolate"):
+            raise ValueError("Unknown scheduler mode: " + str(mode))
+
+        self.threshold = threshold        # Mean absolute difference (0 to 1) that counts as motion
+        self.max_interval = max_interval  # Maximum time between two inferences (seconds)
+        self.mode = mode                  # Landmarks of skipped frames: last ones, or moved by their last velocity
+        self.scale = scale                # Downsampling factor of the motion frame
+        self.window = window              # Time over which the inference rate is measured (seconds)
+
+        # Downsampled frame of the last inference, and the current one
+        self.reference = None
+        self.small = None
+        self.diff = None
+        self.motion = 0.
+
+        # Last two inferred landmarks and their capture times
+        self.landmarks = None
+        self.previous = None
+        self.times = [0., 0.]
+        self.found = False
+
+        # Stats
+        self.runs = deque()
+        self.frames = 0
+        self.skipped = 0
+
+    def due(self, frame, timestamp=None):
+        # True if inference has to run on this frame
+        timestamp = timestamp or time.time()
+        self.frames += 1
+
+        h, w = frame.shape[:2]
+        size = (max(1, w // self.scale), max(1, h // self.scale))
+        self.small = cv2.resize(frame, size, dst=self.small, interpolation=cv2.INTER_AREA)
+
+        if self.reference is None or self.reference.shape != self.small.shape:
+            return True
+        if timestamp - self.times[1] >= self.max_interval:
+            return True
+
+        # Compared to the last inferred frame, so slow motion adds up
+        self.diff = cv2.absdiff(self.small, self.reference, dst=self.diff)
+        self.motion = cv2.mean(self.diff)[0] / 255
+        if self.motion > self.threshold:
+            return True
+
+        self.skipped += 1
+        return False
+
+    def update(self, landmarks, timestamp=None):
+        # Landmarks (n, 4) found on the frame passed to the last due() call, None if nobody was found
+        timestamp = timestamp or time.time()
+        self.reference, self.small = self.small, self.reference
+        self.runs.append(timestamp)
+
+        was_found = self.found
+        self.found = landmarks is not None
+        if not self.found:
+            self.times[1] = timestamp
+            return
+
+        if self.landmarks is None or self.landmarks.shape != landmarks.shape:
+            self.landmarks = np.empty_like(landmarks)
+            self.previous = np.empty_like(landmarks)
+            was_found = False
+        self.landmarks, self.previous = self.previous, self.landmarks
+        self.landmarks[:] = landmarks
+
+        # No velocity from the first landmarks or across a gap
+        if not was_found or timestamp - self.times[1] > self.max_interval * 2:
+            self.previous[:] = landmarks
+        self.times = [self.times[1], timestamp]
+
+    def skip(self, timestamp=None, out=None):
+        # Landmarks for a frame where inference did not run, written to out (the next update reuses ours)
+        if not self.found:
+            return None
+        if out is None:
+            out = np.empty_like(self.landmarks)
+        out[:] = self.landmarks
+        if self.mode == "hold" or self.times[1] <= self.times[0]:
+            return out
+
+        timestamp = timestamp or time.time()
+        velocity = (self.landmarks[:, :3] - self.previous[:, :3]) / (self.times[1] - self.times[0])
+        horizon = min(timestamp - self.times[1], self.max_interval)
+        out[:, :3] += velocity * horizon
+        return out
+
+    def rate(self, now=None):
+        # Inferences per second over the last window
+        now = now or time.time()
+        while self.runs and self.runs[0] < now - self.window:
+            self.runs.popleft()
+        return len(self.runs) / self.window
+
+    def gauges(self):
+        return {
+            ("inference_rate", ""): self.rate(),
+            ("inference_skipped", ""): self.skipped,
+            ("inference_motion", ""): self.motion,
+        }
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+import time
+
+
+class SequenceSync:
+    """Matches messages of several streams of a frame source by device sequence number."""
+
+    def __init__(self, source, max_pending=8, timeout=0.1):
+        self.source = source
+        self.max_pending = max_pending  # Messages buffered per stream
+        self.timeout = timeout          # Time to wait for a match that has not arrived yet
+
+        self.pending = {}  # stream -> OrderedDict(seq -> message), oldest first
+
+        # Stats
+        self.matched = 0
+        self.missed = 0
+        self.evicted = 0
+
+    def get(self, primary, streams=()):
+        # Blocks on the primary stream, then returns {stream: message} with the messages of the other
+        # streams that have the same sequence number (None if it was dropped), None at the end of the source
+        msg = self.source.get(primary)
+        if msg is None:
+            return None
+
+        seq = msg.getSequenceNum()
+        result = {primary: msg}
+        for name in streams:
+            result[name] = self.match(name, seq)
+            if result[name] is None:
+                self.missed += 1
+            else:
+                self.matched += 1
+        return result
+
+    def match(self, name, seq):
+        if name not in self.source.streams:
+            return None
+
+        buffer = self.pending.setdefault(name, OrderedDict())
+        deadline = time.perf_counter() + self.timeout
+
+        while True:
+            # Older messages can never match again
+            while buffer and next(iter(buffer)) < seq:
+                buffer.popitem(last=False)
+                self.evicted += 1
+
+            if seq in buffer:
+                return buffer.pop(seq)
+
+            # Only newer messages, this one was dropped upstream
+            if buffer:
+                return None
+
+            msg = self.source.tryGet(name)
+            if msg is None:
+                if self.source.finished or time.perf_counter() > deadline:
+                    return None
+                time.sleep(0.001)
+                continue
+
+            buffer[msg.getSequenceNum()] = msg
+            while len(buffer) > self.max_pending:
+                buffer.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self):
+        self.pending.clear()
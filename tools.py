@@ -4,9 +4,19 @@ from pythonosc.osc_server import ThreadingOSCUDPServer
 from pythonosc.udp_client import SimpleUDPClient
 from pythonosc.dispatcher import Dispatcher
 from datetime import datetime
+from output import LandmarkFrame, OscSink, OutputPolicy, PolicySink, ShmSink, MultiSink
+from predict import Predictor, PredictSink
+from control import ControlPlane
+from buffers import BufferPool
+from meshwarp import MeshWarp
+from metrics import Metrics
+from itertools import chain
 from threading import Thread
 from pathlib import Path
 import depthai as dai
+import depth_sampling
+import meshwarp
+import metrics
 import numpy as np
 import time
 import json
@@ -22,23 +32,67 @@ class Config:
         self.osc_send_ip = ip
         self.osc_send_port = 2222
         self.osc_sender = None
+        self.control = None
+        self.sink = None
+        self.osc_mode = "messages"  # Options: messages | bundle (one per frame) | blob (bundle + float32 blob)
+
+        # Outputs
+        self.output_sinks = ["osc"]  # Options: osc | shm (shared memory ring buffer for local readers)
+        self.shm_name = "oakd_landmarks"
+        self.shm_slots = 8
+
+        # Output policy
+        self.output_deadband = 0.    # Minimum change of a joint to send it (normalized x, y, z and visibility)
+        self.output_depth_deadband = 0.01  # Minimum change of a sampled depth to send the frame (meters)
+        self.output_max_rate = 0     # Maximum frames sent per second (0 = no limit)
+        self.output_keepalive = 1.   # Resend the full frame at least every n seconds
+        self.output_delta = False    # Only send the joints that moved (/delta)
+
+        # Prediction
+        self.predict = None              # Options: None | velocity | acceleration | kalman
+        self.predict_lookahead = 0.03    # Display latency after sending, landmarks are extrapolated to it (seconds)
+        self.predict_min_confidence = 0.5  # Joints with a lower visibility are sent as measured
 
         # Main parameters
         self.resolution = "720"  # Options: 800 | 720 | 400
         self.fps = 30            # Frame/s (mono cameras)
         self.show_frame = False  # Show the output frame (+fps)
+        self.inference_size = None  # (w, h) of the tracked frame, downscaled on the device (None = full resolution)
+        self.pipeline_mode = "auto"  # Options: auto | stereo | rectify | mono (one camera only, up to 120 fps at 400p)
+        self.cam_source = "right"    # Options: right | left (no depth, the disparity is aligned to the right camera)
 
         # Tracking
         self.tracking = True     # Activate OpenPose Tracking
         self.model = model       # Options: 0=lite | 1=full | 2=heavy
+        self.pose_backend = "mediapipe"  # Options: mediapipe | tflite (lite landmark model only) | movenet (on device)
+        self.send_z_visibility = False  # Also send /z and /visibility
+
+        # Inference scheduling
+        self.schedule = False            # Skip inference on frames where nothing moved
+        self.schedule_threshold = 0.01   # Mean difference with the last inferred frame that counts as motion (0 to 1)
+        self.schedule_max_interval = 0.5  # Run inference at least every n seconds
+        self.schedule_mode = "hold"      # Options: hold (resend last landmarks) | extrapolate (last velocity)
+
+        # Presence
+        self.presence = False            # Stop inference while nobody is in the warped zone (/presence 0 | 1)
+        self.presence_threshold = 0.01   # Fraction of foreground pixels that counts as presence
+        self.presence_idle_after = 10.   # Go idle after n seconds without presence
+        self.idle_fps = 0                # Frames checked per second while idle (0 = all, wakes on the next frame)
 
         # Depth tracking
         self.depth = False       # Track on depth image
         self.max_disparity = 0.  # Maximum disparity (get from camera later)
 
+        # Sampled depth
+        self.sample_depth = False    # Send the metric depth of each landmark (/depth, meters)
+        self.depth_patch = 3         # Radius of the disparity patch read around each landmark (pixels)
+        self.depth_focal = None      # Focal length of the rectified camera in pixels (None = device calibration)
+        self.depth_baseline = None   # Stereo baseline in meters (None = device calibration)
+
         # Color map
-        self.cv_color_map = cv2.applyColorMap(np.arange(256, dtype=np.uint8), cv2.COLORMAP_BONE)
+        self.cv_color_map = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cv2.COLORMAP_BONE)
         self.cv_color_map[0] = [0, 0, 0]
+        self.disparity_lut = DisparityLut()
 
         # Night vision
         self.laser_val = 0       # Project dots for active depth (0 to 1)
@@ -49,21 +103,54 @@ class Config:
         self.extended = False    # Closer-in minimum depth, disparity range is doubled
         self.subpixel = True     # Better accuracy for longer distance
         self.median = "7x7"      # Options: OFF | 3x3 | 5x5 | 7x7
+        self.confidence = None   # Disparity confidence threshold (0 to 255, None = preset default)
 
         # Verbose
         self.verbose = False     # Print (some) info about cam
 
+        # Engine
+        self.queue_size = 2      # Frames buffered between capture, inference and output
+        self.queue_policy = "drop_oldest"  # Options: drop_oldest | block
+        self.report_interval = 0  # Print engine stats every n seconds (0 = off)
+        self.buffers = BufferPool()  # Host frame buffers, reused instead of allocated per frame
+
+        # Inference pool
+        self.pool_workers = 0            # Processes running host inference (0 = in-process, 1 per camera with stream)
+        self.pool_mode = "stream"        # Options: stream (worker per camera) | round_robin (stateless models only)
+        self.pool_timeout = 1.           # Results later than this are dropped (seconds)
+
+        # Metrics
+        self.metrics = Metrics()
+        self.metrics_port = 9101  # Prometheus endpoint on http://127.0.0.1:<port>/metrics (0 = off)
+        self.stats_interval = 5   # Send /stats over OSC every n seconds (0 = off)
+
+        # Record / replay
+        self.record_path = None   # Record device frames to this file
+        self.replay_path = None   # Replay a recording instead of opening the device
+        self.replay_realtime = True  # Replay at the recorded rate (False = as fast as possible)
+        self.replay_loop = False  # Restart the replay when it reaches the end
+
         # Mesh
         self.mesh_path = Path(__file__).parent.joinpath('utils/mesh.json')
         self.save_mesh_config = False
 
         # OpenPose
         self.mp_pose_model_complexity = self.model
-        self.mp_pose_enable_segmentation = True
+        self.mp_pose_enable_segmentation = False  # The mask is not used
         self.mp_pose_smooth_segmentation = True
         self.mp_pose_min_detection_confidence = 0.5
         self.mp_pose_min_tracking_confidence = 0.5
 
+        # TFLite
+        self.tflite_path = Path(__file__).parent.joinpath('utils/pose_landmark_lite.tflite')
+        self.tflite_threads = 4        # Interpreter threads
+        self.tflite_min_score = 0.5    # Pose flag under which the tracked region is reset to the whole frame
+
+        # MoveNet
+        self.movenet_model = "lightning"  # Options: lightning | thunder
+        self.check_consistency = True     # Hold joints too far from their neighbours
+        self.consistency_threshold = 2.2
+
         # Resolution
         self.res_map = {
             '800': {'w': 1280, 'h': 800, 'res': dai.MonoCameraProperties.SensorResolution.THE_800_P},
@@ -82,21 +169,42 @@ class Config:
         self.median = self.median_map[self.median]
 
         # Warp
-        self.warp_pos = np.zeros(8, dtype=int)
+        self.warp = (np.zeros(8, dtype=int), None)  # (warp_pos, mesh), replaced as a whole (set_warp)
         self.corners_min = 0
         self.corners_max = 255
         self.find_corners = False
         self.send_warp_config = False
+        self.live_warp = True    # Warp with ImageManip so the mesh can change without restarting
+        self.host_warp = False   # Warp on the host with an NxM mesh instead of on the device
+        self.mesh_warp = MeshWarp()
+
+        # Live reconfiguration
+        self.send_camera_config = False
+        self.pipeline_signature = None  # Settings the running pipeline was built with
+        self.pipeline_report = []       # (node, reason) of the running pipeline
+        self.source_stream = False      # The running pipeline streams the unwarped frame
+        self.warped_stream = False      # The running pipeline streams the warped frame
+        self.stereo_config = None       # Initial stereo config of the running pipeline
 
         # Running state
         self.running = False
 
+    @property
+    def warp_pos(self):
+        return self.warp[0]
+
+    @property
+    def mesh(self):
+        # NxM control mesh (rows, cols, 2) in pixels, None = warp_pos corners
+        return self.warp[1]
+
 
 # --------------------------------------- OSC ---------------------------------------
-def initialize_osc(config):
+def initialize_osc(config, joints=33):
     # Receiver
     disp = Dispatcher()
-    disp.map("/*", lambda osc_address, *msg: handle_msg(osc_address, msg, config))
+    config.control = ControlPlane(OSC_HANDLERS)
+    disp.map("/*", config.control.push)
 
     server = ThreadingOSCUDPServer((config.osc_receive_ip, config.osc_receive_port), disp)
     print("Listening on port", config.osc_receive_port)
@@ -106,32 +214,117 @@ def initialize_osc(config):
 
     # Sender
     config.osc_sender = SimpleUDPClient(config.osc_send_ip, config.osc_send_port)
+    sinks = []
+    if "osc" in config.output_sinks:
+        sinks.append(PolicySink(
+            OscSink(config.osc_sender, config.osc_mode, config.send_z_visibility),
+            OutputPolicy(config.output_deadband, config.output_max_rate, config.output_keepalive,
+                         config.output_depth_deadband),
+            config.output_delta
+        ))
+
+    # Shared memory
+    if "shm" in config.output_sinks:
+        sinks.append(ShmSink(config.shm_name, joints, config.shm_slots))
+        print("Writing landmarks to shared memory", config.shm_name)
+
+    config.sink = MultiSink(sinks)
+
+    # Latency compensation
+    if config.predict:
+        predictor = Predictor(joints, config.predict, config.predict_lookahead, config.predict_min_confidence)
+        config.sink = PredictSink(config.sink, predictor, joints)
+
     print("Sending on", config.osc_send_ip, config.osc_send_port)
 
 
-def handle_msg(osc_address, msg, config):
-    address_handlers = {
-        "/show_frame": lambda: setattr(config, 'show_frame', bool(msg[0])) or (
-            cv2.destroyWindow("Source") if not bool(msg[0]) else None,
-            cv2.destroyWindow("Warped") if not bool(msg[0]) else None,
-            cv2.destroyWindow("Warped and tracked") if not bool(msg[0]) else None,
-            cv2.destroyWindow("Rectangle") if not bool(msg[0]) else None,
-            setattr(config, 'show_frame', bool(msg[0]))
-        ),
-        "/warp_pos": lambda: setattr(config, 'warp_pos', [
-            (int(msg[i * 2] * config.resolution['w']), int(msg[(i * 2) + 1] * config.resolution['h']))
-            if i * 2 < len(msg) and (i * 2) + 1 < len(msg)
-            else (0, 0)
-            for i in range(4)
-        ]),
-        "/warp_go": lambda: setattr(config, 'send_warp_config', True),
-        "/warp_save": lambda: setattr(config, 'save_mesh_config', True),
-        "/corners_find": lambda: setattr(config, 'find_corners', True),
-        "/corners_thresh": lambda: setattr(config, 'corners_min', msg[0]) and setattr(config, 'corners_max', msg[1]),
-    }
-    handler = address_handlers.get(osc_address)
-    if handler:
-        handler()
+def set_show_frame(config, msg):
+    config.show_frame = bool(msg[0])
+    config.send_camera_config = True  # The full resolution preview stream may have to be added
+    if not config.show_frame:
+        for window in ("Source", "Warped", "Warped and tracked", "Rectangle"):
+            try:
+                cv2.destroyWindow(window)
+            except cv2.error:
+                pass  # Not open
+
+
+def set_warp(config, warp_pos, mesh=None):
+    # One assignment, the inference and output threads read the corners and mesh of the same update
+    config.warp = (warp_pos, mesh)
+
+
+def set_warp_pos(config, msg):
+    set_warp(config, [
+        (int(msg[i * 2] * config.resolution['w']), int(msg[(i * 2) + 1] * config.resolution['h']))
+        if i * 2 < len(msg) and (i * 2) + 1 < len(msg)
+        else (0, 0)
+        for i in range(4)
+    ])
+
+
+def set_warp_mesh(config, msg):
+    # The device warp only takes 4 corners, a denser mesh would be shown and saved but never applied
+    if not config.host_warp:
+        raise ValueError("/warp_mesh needs config.host_warp, use /warp_pos for the device warp")
+    mesh = meshwarp.mesh_from_osc(msg, config.resolution)
+    set_warp(config, mesh_corners(mesh), mesh)
+
+
+def set_corners_thresh(config, msg):
+    config.corners_min = msg[0]
+    config.corners_max = msg[1]
+
+
+def set_camera(name, cast):
+    # Camera settings are pushed to the device once all pending commands are applied
+    def handler(config, msg):
+        setattr(config, name, cast(msg[0]))
+        config.send_camera_config = True
+    return handler
+
+
+def set_median(config, msg):
+    # Accepts "OFF" | "3x3" | "5x5" | "7x7" or the kernel size (0 = off)
+    value = msg[0]
+    if not isinstance(value, str):
+        value = "%dx%d" % (value, value) if value else "OFF"
+    config.median = config.median_map[value]
+    config.send_camera_config = True
+
+
+def set_find_corners(config, msg):
+    config.find_corners = True
+    config.send_camera_config = True  # The unwarped stream may have to be added
+
+
+def set_flag(name):
+    return lambda config, msg: setattr(config, name, True)
+
+
+OSC_HANDLERS = {
+    "/show_frame": set_show_frame,
+    "/warp_pos": set_warp_pos,
+    "/warp_mesh": set_warp_mesh,
+    "/warp_go": set_flag('send_warp_config'),
+    "/warp_save": set_flag('save_mesh_config'),
+    "/corners_find": set_find_corners,
+    "/corners_thresh": set_corners_thresh,
+    "/ir": set_camera('ir_val', float),
+    "/laser": set_camera('laser_val', float),
+    "/median": set_median,
+    "/lrcheck": set_camera('lrcheck', bool),
+    "/confidence": set_camera('confidence', int),
+    "/fps": set_camera('fps', int),
+}
+
+
+# --------------------------------------- METRICS ---------------------------------------
+def initialize_metrics(config):
+    config.metrics.collectors["buffers"] = config.buffers.gauges
+    if config.metrics_port:
+        metrics.serve(config.metrics, config.metrics_port)
+        print("Metrics on http://127.0.0.1:%d/metrics" % config.metrics_port)
 
 
 # --------------------------------------- CAMERA ---------------------------------------
@@ -139,8 +332,21 @@ def create_mesh(res):
     return [(j * res['w'], i * res['h']) for i in range(2) for j in range(2)]
 
 
-def save_mesh(path, warp_pos):
-    if not isinstance(warp_pos, list):
+def get_mesh(config):
+    warp_pos, mesh = config.warp
+    return mesh if mesh is not None else meshwarp.mesh_from_corners(warp_pos)
+
+
+def mesh_corners(mesh):
+    # Outer corners of an NxM mesh, in warp_pos order
+    return mesh[[0, 0, -1, -1], [0, -1, 0, -1]].astype(int)
+
+
+def save_mesh(path, warp_pos, mesh=None):
+    if mesh is not None:
+        # NxM mesh
+        warp_pos = {'rows': mesh.shape[0], 'cols': mesh.shape[1], 'points': mesh.reshape(-1, 2).tolist()}
+    elif not isinstance(warp_pos, list):
         warp_pos = warp_pos.tolist()
     with open(path, 'w') as filehandle:
         json.dump(warp_pos, filehandle)
@@ -151,88 +357,347 @@ def load_custom_mesh(config):
         if config.mesh_path is not None:
             with open(str(config.mesh_path), 'r') as data:
                 mesh = json.loads(data.read())
-            config.warp_pos = np.array(mesh)
+
+            if isinstance(mesh, dict):
+                # NxM mesh, the device warp uses its outer corners
+                mesh = np.array(mesh['points'], dtype=np.float32).reshape(mesh['rows'], mesh['cols'], 2)
+                set_warp(config, mesh_corners(mesh), mesh)
+            else:
+                set_warp(config, np.array(mesh))
             print("Custom mesh loaded")
     else:
-        config.warp_pos = create_mesh(config.resolution)
+        set_warp(config, create_mesh(config.resolution))
         print("No custom mesh")
 
 
+class DisparityLut:
+    def __init__(self):
+        self.key = None
+        self.scale = 1.
+        self.color_map = None  # (256, 1, 3), with the scale baked in for 8 bit disparity
+        self.gray = None
+
+    def update(self, max_disparity, color_map, dtype):
+        # The color map is compared by identity, assign a new array to change it
+        key = (max_disparity, id(color_map), dtype)
+        if key == self.key:
+            return
+        self.key = key
+
+        self.scale = 255. / max_disparity
+        color_map = color_map.reshape(256, 3)
+        if dtype == np.uint8:
+            codes = np.minimum(np.arange(256) * self.scale, 255).astype(np.uint8)
+            color_map = color_map[codes]
+        self.color_map = np.ascontiguousarray(color_map.reshape(256, 1, 3))
+
+    def apply(self, frame, max_disparity, color_map, buffers):
+        self.update(max_disparity, color_map, frame.dtype)
+
+        # Subpixel disparity (uint16) is scaled and clipped to 8 bit in one pass, then colored
+        if frame.dtype == np.uint8:
+            gray = frame
+        else:
+            self.gray = cv2.convertScaleAbs(frame, self.gray, self.scale)
+            gray = self.gray
+
+        # The colored frame goes on to the output and the preview, it gets a pooled buffer
+        return cv2.applyColorMap(gray, self.color_map, dst=buffers.like("disparity", gray, 3))
+
+
 def get_disparity_frame(frame, config):
-    disp = (frame * (255.0 / config.max_disparity)).astype(np.uint8)
-    disp = cv2.applyColorMap(disp, config.cv_color_map)
-    return disp
+    return config.disparity_lut.apply(frame, config.max_disparity, config.cv_color_map, config.buffers)
+
+
+def get_pipeline_mode(config):
+    if config.cam_source == "left" and (config.depth or config.sample_depth):
+        raise ValueError("Depth is aligned to the right camera")
+
+    # auto: stereo matching only when disparity is used, otherwise rectification only
+    if config.pipeline_mode == "auto":
+        return "stereo" if config.depth or config.sample_depth else "rectify"
+    if config.pipeline_mode == "mono" and (config.depth or config.sample_depth):
+        raise ValueError("Depth needs the stereo pipeline mode")
+    if config.pipeline_mode not in ("stereo", "rectify", "mono"):
+        raise ValueError("Unknown pipeline mode: " + str(config.pipeline_mode))
+    return config.pipeline_mode
+
+
+def source_stream_name(config):
+    return "rectifiedRight" if config.cam_source == "right" else "rectifiedLeft"
 
 
-def create_pipeline(config):
+def use_source_stream(config):
+    # The unwarped frame is only read for the preview and the corner detection
+    return config.show_frame or config.find_corners
+
+
+def use_warped_stream(config, backend=None):
+    # Device backends only read the warped frame to show it
+    return backend is None or backend.on_host or config.show_frame
+
+
+def create_node(pipeline, config, node_type, reason, stream=None):
+    node = pipeline.create(node_type)
+    name = node_type.__name__
+    if stream is not None:
+        node.setStreamName(stream)
+        name += " '" + stream + "'"
+    config.pipeline_report.append((name, reason))
+    return node
+
+
+def create_pipeline(config, backend=None):
     pipeline = dai.Pipeline()
+    mode = get_pipeline_mode(config)
+    config.pipeline_report = []
 
     # Low light tuning
     tuning_path = Path(__file__).parent.joinpath('utils/tuning_mono_low_light.bin')
     pipeline.setCameraTuningBlobPath(tuning_path)
 
-    # Mono left camera
-    cam_left = pipeline.create(dai.node.MonoCamera)
-    cam_left.setCamera("left")
+    # Mono camera of the tracked image
+    cameras = {}
+    cameras[config.cam_source] = create_node(pipeline, config, dai.node.MonoCamera, "tracked camera")
 
-    # Mono right camera
-    cam_right = pipeline.create(dai.node.MonoCamera)
-    cam_right.setCamera("right")
+    # Other mono camera
+    if mode != "mono":
+        other = "left" if config.cam_source == "right" else "right"
+        cameras[other] = create_node(pipeline, config, dai.node.MonoCamera, "second camera for " + mode)
 
-    # Set resolution and fps
-    for mono_cam in (cam_left, cam_right):
+    # Set camera, resolution and fps
+    for name, mono_cam in cameras.items():
+        mono_cam.setCamera(name)
         mono_cam.setResolution(config.resolution['res'])
         mono_cam.setFps(config.fps)
 
-    # Create stereo pipeline
-    stereo = pipeline.create(dai.node.StereoDepth)
-    cam_left.out.link(stereo.left)
-    cam_right.out.link(stereo.right)
-
-    # Stereo settings
-    stereo.setDefaultProfilePreset(dai.node.StereoDepth.PresetMode.HIGH_DENSITY)
-    stereo.initialConfig.setMedianFilter(config.median)
-    stereo.setRectifyEdgeFillColor(0)
-    stereo.setLeftRightCheck(config.lrcheck)
-    stereo.setExtendedDisparity(config.extended)
-    stereo.setSubpixel(config.subpixel)
-
-    # Get max disparity
-    config.max_disparity = stereo.initialConfig.getMaxDisparity()
-
-    # Stream out depth (actually disparity)
-    if config.depth:
-        xout_depth = pipeline.create(dai.node.XLinkOut)
-        xout_depth.setStreamName("depth")
-        stereo.disparity.link(xout_depth.input)
+    config.stereo_config = None
+    if mode == "mono":
+        # Unrectified, the warp mesh is set on this image anyway
+        source = cameras[config.cam_source].out
+    else:
+        # Create stereo pipeline
+        reason = "disparity" if mode == "stereo" else "rectification only, no post-processing"
+        stereo = create_node(pipeline, config, dai.node.StereoDepth, reason)
+        cameras["left"].out.link(stereo.left)
+        cameras["right"].out.link(stereo.right)
+        source = stereo.rectifiedRight if config.cam_source == "right" else stereo.rectifiedLeft
+
+        # Stereo settings
+        stereo.setRectifyEdgeFillColor(0)
+        if mode == "stereo":
+            stereo.setDefaultProfilePreset(dai.node.StereoDepth.PresetMode.HIGH_DENSITY)
+            stereo.initialConfig.setMedianFilter(config.median)
+            stereo.setLeftRightCheck(config.lrcheck)
+            stereo.setExtendedDisparity(config.extended)
+            stereo.setSubpixel(config.subpixel)
+            if config.confidence is not None:
+                stereo.initialConfig.setConfidenceThreshold(config.confidence)
+        else:
+            # The disparity is still computed by the hardware, but nothing runs on top of it
+            stereo.initialConfig.setMedianFilter(dai.StereoDepthProperties.MedianFilter.MEDIAN_OFF)
+            stereo.setLeftRightCheck(False)
+            stereo.setExtendedDisparity(False)
+            stereo.setSubpixel(False)
+
+        # Get max disparity
+        config.max_disparity = stereo.initialConfig.getMaxDisparity()
+
+    if mode == "stereo":
+        # Stream out depth (actually disparity), depth tracking gets it through the warped stream
+        if config.sample_depth:
+            xout_depth = create_node(pipeline, config, dai.node.XLinkOut, "sampled depth", "depth")
+            stereo.disparity.link(xout_depth.input)
+
+        # Runtime stereo config (median, confidence, LR-check)
+        stereo.setRuntimeModeSwitch(True)
+        xin_stereo_cfg = create_node(pipeline, config, dai.node.XLinkIn, "live stereo settings", "stereo_cfg")
+        xin_stereo_cfg.out.link(stereo.inputConfig)
+        config.stereo_config = stereo.initialConfig.get()
+
+    # Stream out rectified
+    config.source_stream = use_source_stream(config)
+    if config.source_stream:
+        xout_rectif = create_node(pipeline, config, dai.node.XLinkOut, "preview / corner detection",
+                                  source_stream_name(config))
+        source.link(xout_rectif.input)
+
+    # Stream out unwarped, the host applies the NxM mesh
+    if config.host_warp:
+        config.warped_stream = True
+        if config.depth:
+            create_warped_output(pipeline, config, stereo.disparity)
+        else:
+            create_warped_output(pipeline, config, source)
+
+        config.pipeline_signature = get_pipeline_signature(config)
+        return pipeline
+
+    # Create warp pipeline (ImageManip can't warp disparity frames)
+    if use_live_warp(config):
+        warp = create_node(pipeline, config, dai.node.ImageManip, "warp, corners can change live")
+        warp.initialConfig.setWarpTransformFourPoints(warp_points(config), False)
+        warp.setMaxOutputFrameSize(config.resolution['w'] * config.resolution['h'])
+
+        xin_warp_cfg = create_node(pipeline, config, dai.node.XLinkIn, "live warp corners", "warp_cfg")
+        xin_warp_cfg.out.link(warp.inputConfig)
+    else:
+        warp = create_node(pipeline, config, dai.node.Warp, "mesh warp")
 
-    # Stream out rectified right
-    xout_rectif_right = pipeline.create(dai.node.XLinkOut)
-    xout_rectif_right.setStreamName("rectifiedRight")
-    stereo.rectifiedRight.link(xout_rectif_right.input)
+        # Warp settings
+        warp.setWarpMesh(config.warp_pos, 2, 2)
+        warp.setOutputSize(config.resolution['w'], config.resolution['h'])
+        warp.setMaxOutputFrameSize(config.resolution['w'] * config.resolution['h'] * (2 if config.depth else 1))
+        warp.setHwIds([1])
+        warp.setInterpolation(dai.Interpolation.NEAREST_NEIGHBOR)
 
-    # Create warp pipeline
-    warp = pipeline.create(dai.node.Warp)
     if config.depth:
         stereo.disparity.link(warp.inputImage)
     else:
-        stereo.rectifiedRight.link(warp.inputImage)
-
-    # Warp settings
-    warp.setWarpMesh(config.warp_pos, 2, 2)
-    warp.setOutputSize(config.resolution['w'], config.resolution['h'])
-    warp.setMaxOutputFrameSize(config.resolution['w'] * config.resolution['h'] * 3)
-    warp.setHwIds([1])
-    warp.setInterpolation(dai.Interpolation.NEAREST_NEIGHBOR)
+        source.link(warp.inputImage)
 
     # Stream out warped
-    xout_warped = pipeline.create(dai.node.XLinkOut)
-    xout_warped.setStreamName("warped")
-    warp.out.link(xout_warped.input)
+    config.warped_stream = use_warped_stream(config, backend)
+    if config.warped_stream:
+        create_warped_output(pipeline, config, warp.out)
+
+    # Device inference
+    if backend is not None:
+        backend.attach(pipeline, config, warp.out)
 
+    config.pipeline_signature = get_pipeline_signature(config)
     return pipeline
 
 
+def create_warped_output(pipeline, config, out):
+    xout_warped = create_node(pipeline, config, dai.node.XLinkOut, "tracked frame", "warped")
+    if not use_resize(config):
+        out.link(xout_warped.input)
+        return
+
+    # Only the downscaled frame goes over USB for tracking
+    w, h = config.inference_size
+    resize = create_node(pipeline, config, dai.node.ImageManip, "downscale to %dx%d for tracking" % (w, h))
+    resize.initialConfig.setResize(w, h)
+    resize.setKeepAspectRatio(False)
+    resize.setMaxOutputFrameSize(w * h)
+    out.link(resize.inputImage)
+    resize.out.link(xout_warped.input)
+
+    # Full resolution warped frame, for the preview only
+    if use_preview(config):
+        xout_preview = create_node(pipeline, config, dai.node.XLinkOut, "full resolution preview", "preview")
+        out.link(xout_preview.input)
+
+
+def print_pipeline_report(config):
+    print("Pipeline (%s, %dx%d at %d fps):" % (get_pipeline_mode(config), config.resolution['w'],
+                                               config.resolution['h'], config.fps))
+    for name, reason in config.pipeline_report:
+        print("  %-28s %s" % (name, reason))
+
+
+def use_resize(config):
+    # ImageManip can't resize disparity frames
+    return config.inference_size is not None and not config.depth
+
+
+def use_preview(config):
+    # The host warp preview shows the tracked frame
+    return use_resize(config) and config.show_frame and not config.host_warp
+
+
+def get_frame_mesh(config, frame):
+    # Mesh in the pixels of a (possibly downscaled) frame
+    scale = (frame.shape[1] / config.resolution['w'], frame.shape[0] / config.resolution['h'])
+    mesh = get_mesh(config)
+    return mesh if scale == (1, 1) else mesh * np.float32(scale)
+
+
+def use_live_warp(config):
+    return config.live_warp and not config.depth and not config.host_warp
+
+
+def warp_points(config):
+    # warp_pos is [top-left, top-right, bottom-left, bottom-right], ImageManip wants them clockwise
+    return [dai.Point2f(float(config.warp_pos[i][0]), float(config.warp_pos[i][1])) for i in (0, 1, 3, 2)]
+
+
+def get_pipeline_signature(config):
+    # Settings that can only change by rebuilding the pipeline
+    signature = [get_pipeline_mode(config), config.resolution['w'], config.resolution['h'], config.fps,
+                 config.depth, config.extended, config.subpixel, config.host_warp, use_live_warp(config),
+                 config.sample_depth, use_resize(config) and list(config.inference_size), use_preview(config)]
+    if not use_live_warp(config) and not config.host_warp:
+        signature.append(np.asarray(config.warp_pos).tolist())
+    return signature
+
+
+def read_calibration(config, device):
+    # Rectified right camera, which the disparity is aligned to
+    calibration = device.readCalibration()
+    intrinsics = calibration.getCameraIntrinsics(dai.CameraBoardSocket.CAM_C,
+                                                 config.resolution['w'], config.resolution['h'])
+    config.depth_focal = intrinsics[0][0]
+    config.depth_baseline = calibration.getBaselineDistance() / 100  # cm -> m
+
+
+def warped_to_source(config, u, v):
+    # Normalized warped frame positions -> pixels of the rectified frame
+    w, h = config.resolution['w'], config.resolution['h']
+    warp_pos, mesh = config.warp
+    if use_live_warp(config):
+        corners = np.float32([[0, 0], [w, 0], [0, h], [w, h]])
+        transform = cv2.getPerspectiveTransform(corners, np.float32(warp_pos).reshape(4, 2))
+        points = np.stack([u * w, v * h], axis=1).astype(np.float32).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(points, transform).reshape(-1, 2).T
+    return meshwarp.sample_mesh(mesh if mesh is not None else meshwarp.mesh_from_corners(warp_pos), u, v).T
+
+
+def sample_landmark_depth(config, disparity, raw, out=None):
+    # Metric depth at each landmark from a small patch of the raw disparity frame
+    if config.depth_focal is None or config.depth_baseline is None:
+        focal = depth_sampling.default_focal(config.resolution['w'])
+        baseline = depth_sampling.DEFAULT_BASELINE
+    else:
+        focal, baseline = config.depth_focal, config.depth_baseline
+
+    px, py = warped_to_source(config, raw[:, 0], raw[:, 1])
+    codes = depth_sampling.sample_disparity(disparity, px, py, config.depth_patch)
+    return depth_sampling.disparity_to_depth(codes, focal, baseline, 3 if config.subpixel else 0, out)
+
+
+def needs_rebuild(config):
+    # The unwarped and warped streams are added when needed, but not removed when they are closed
+    if use_source_stream(config) and not config.source_stream:
+        return True
+    if config.show_frame and not config.warped_stream:
+        return True
+    return get_pipeline_signature(config) != config.pipeline_signature
+
+
+def send_live_config(config, device):
+    # Night vision
+    device.setIrLaserDotProjectorIntensity(config.laser_val)
+    device.setIrFloodLightIntensity(config.ir_val)
+
+    # Stereo, only the stereo mode takes live settings
+    if config.stereo_config is not None:
+        stereo_cfg = dai.StereoDepthConfig()
+        stereo_cfg.set(config.stereo_config)
+        stereo_cfg.setMedianFilter(config.median)
+        stereo_cfg.setLeftRightCheck(config.lrcheck)
+        if config.confidence is not None:
+            stereo_cfg.setConfidenceThreshold(config.confidence)
+        device.getInputQueue("stereo_cfg").send(stereo_cfg)
+
+    # Warp
+    if use_live_warp(config):
+        warp_cfg = dai.ImageManipConfig()
+        warp_cfg.setWarpTransformFourPoints(warp_points(config), False)
+        device.getInputQueue("warp_cfg").send(warp_cfg)
+
+
 def find_corners(image, config):
     image = cv2.GaussianBlur(image, (5, 5), 0)
     _, image = cv2.threshold(image, config.corners_min, config.corners_max, cv2.THRESH_BINARY)
@@ -265,6 +730,75 @@ def find_corners(image, config):
     return result
 
 
+# --------------------------------------- TRACKING ---------------------------------------
+def read_landmarks(results, out=None):
+    # MediaPipe landmarks -> (33, 4) float32 array of x, y, z, visibility
+    if out is None:
+        out = np.empty((33, 4), dtype=np.float32)
+    landmarks = results.pose_landmarks.landmark
+    out.reshape(-1)[:] = np.fromiter(
+        chain.from_iterable((lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks),
+        dtype=np.float32, count=len(landmarks) * 4)
+    return out
+
+
+class Landmarks:
+    def __init__(self, count=33, nose_size=3):
+        # Last valid x, y (flipped), z, visibility of each landmark
+        self.frame = LandmarkFrame(count)
+        self.frame.nose_size = nose_size
+        self.values = self.frame.data
+        self.valid = np.zeros(count, dtype=bool)
+        self.nose = self.frame.nose
+
+    def update(self, raw):
+        x = raw[:, 0]
+        y = 1 - raw[:, 1]
+
+        # Hold the last valid value of landmarks outside the frame (or rejected, nan)
+        np.logical_and(x > 0, x < 1, out=self.valid)
+        self.valid &= (y > 0) & (y < 1)
+
+        self.values[self.valid, 0] = x[self.valid]
+        self.values[self.valid, 1] = y[self.valid]
+        self.values[self.valid, 2:] = raw[self.valid, 2:]
+
+        if self.valid[0]:
+            self.nose[:] = (x[0], y[0], raw[0, 2] + 1)
+
+    @property
+    def x(self):
+        return self.values[:, 0]
+
+    @property
+    def y(self):
+        return self.values[:, 1]
+
+    @property
+    def z(self):
+        return self.values[:, 2]
+
+    @property
+    def visibility(self):
+        return self.values[:, 3]
+
+
+def send_landmarks(config, landmarks):
+    config.sink.send(landmarks.frame)
+
+
+def draw_landmarks(frame, raw, skeleton=()):
+    h, w = frame.shape[:2]
+    valid = np.isfinite(raw[:, :2]).all(axis=1).tolist()
+    points = (np.nan_to_num(raw[:, :2]) * (w, h)).astype(int).tolist()
+    for point, ok in zip(points, valid):
+        if ok:
+            cv2.circle(frame, tuple(point), 5, (255, 0, 0), cv2.FILLED)
+    for a, b in skeleton:
+        if valid[a] and valid[b]:
+            cv2.line(frame, tuple(points[a]), tuple(points[b]), (0, 255, 0), 2)
+
+
 # --------------------------------------- VISUALISATION ---------------------------------------
 def show_frame(frame):
     current_time = time.time()
@@ -282,19 +816,20 @@ def show_source_frame(q_rectified, config):
     if config.show_frame:
         frame = q_rectified
         if frame is not None:
-            source = frame.getCvFrame()
-            source = cv2.cvtColor(source, cv2.COLOR_GRAY2BGR)
+            source = frame.getFrame()
+            source = cv2.cvtColor(source, cv2.COLOR_GRAY2BGR, dst=config.buffers.like("source", source, 3))
             color = (0, 0, 255)
-            for i in range(4):
-                cv2.circle(source, (config.warp_pos[i][0], config.warp_pos[i][1]), 4, color, -1)
+            mesh = get_mesh(config).astype(int).tolist()
+            rows, cols = len(mesh), len(mesh[0])
+            for i in range(rows):
+                for j in range(cols):
+                    cv2.circle(source, tuple(mesh[i][j]), 4, color, -1)
 
-                if i % 2 != 2 - 1:
-                    cv2.line(source, (config.warp_pos[i][0], config.warp_pos[i][1]),
-                             (config.warp_pos[i + 1][0], config.warp_pos[i + 1][1]), color, 2)
+                    if j + 1 < cols:
+                        cv2.line(source, tuple(mesh[i][j]), tuple(mesh[i][j + 1]), color, 2)
 
-                if i + 2 < 4:
-                    cv2.line(source, (config.warp_pos[i][0], config.warp_pos[i][1]),
-                             (config.warp_pos[i + 2][0], config.warp_pos[i + 2][1]), color, 2)
+                    if i + 1 < rows:
+                        cv2.line(source, tuple(mesh[i][j]), tuple(mesh[i + 1][j]), color, 2)
 
             cv2.imshow("Source", source)
 